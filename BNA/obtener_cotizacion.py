@@ -3,19 +3,18 @@ from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
-import csv
 import os
+import sys
 import logging
 
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from arbolito.logs import setup_logging
+from arbolito.quote import Quote
+from arbolito.store import QUOTES_PATH, QuoteStore
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('exchange_rate_log.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(os.path.join(REPO_ROOT, 'log', 'exchange_rate_log.log'))
 
 def get_exchange_rate():
     """Fetch USD to ARS exchange rate from BNA website"""
@@ -79,21 +78,12 @@ def get_exchange_rate():
             logging.warning("Could not properly close browser session")
 
 def save_to_csv(data):
-    """Save collected data to CSV file"""
-    file_exists = os.path.isfile('exchange_rates.csv')
-    
+    """Save collected data through the shared quote store"""
     try:
-        with open('exchange_rates.csv', 'a', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['collection_time', 'exchange_date', 'buy_rate', 'sell_rate', 'source', 'status']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            if not file_exists:
-                writer.writeheader()
-                
-            writer.writerow(data)
-            
+        result = QuoteStore(os.path.join(REPO_ROOT, QUOTES_PATH)).append([Quote.from_record(data)])
+        logging.info("Saved %d new quotes (%d unchanged)", result['written'], result['heartbeats'])
     except Exception as e:
-        logging.error(f"Failed to save to CSV: {str(e)}")
+        logging.error("Failed to save to CSV: %s", e)
 
 if __name__ == "__main__":
     start_time = datetime.now()
@@ -6,18 +6,19 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import requests
-import csv
 import os
+import sys
 import logging
 import json
 
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from arbolito.logs import setup_logging
+from arbolito.quote import Quote
+from arbolito.store import QUOTES_PATH, QuoteStore
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("exchange_rate_log.log"), logging.StreamHandler()],
-)
+setup_logging(os.path.join(REPO_ROOT, "log", "exchange_rate_log.log"))
 
 
 def get_exchange_rate_BNA():
@@ -269,7 +270,8 @@ def get_exchange_rate_bbva():
         response = requests.get(url, timeout=10)
         data = response.json()
 
-        logging.debug(f"Full BBVA response:\n{json.dumps(data, indent=2)}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Full BBVA response:\n%s", json.dumps(data, indent=2))
 
         for item in data.get("respuesta", []):
             moneda = item.get("moneda", {})
@@ -301,90 +303,27 @@ def get_exchange_rate_bbva():
 
 
 def save_to_csv(data_list):
-    """Save collected data to CSV file"""
-    csv_filename = "exchange_rates.csv"
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_path = os.path.join(script_dir, csv_filename)
-    logging.info(f"Attempting to save data to CSV at: {csv_path}")
+    """Save collected data through the shared quote store"""
+    csv_path = os.path.join(REPO_ROOT, QUOTES_PATH)
+    logging.info("Saving data to CSV at: %s", csv_path)
 
     try:
-        file_exists = os.path.isfile(csv_path)
-
-        # Try to create the file if it doesn't exist
-        if not file_exists:
-            with open(csv_path, "w", newline="", encoding="utf-8") as f:
-                pass
-            logging.info(f"Created new file at {csv_path}")
-
-        with open(csv_path, "a", newline="", encoding="utf-8") as csvfile:
-            fieldnames = [
-                "collection_time",
-                "exchange_date",
-                "buy_rate",
-                "sell_rate",
-                "source",
-                "status",
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-            if not file_exists:
-                writer.writeheader()
-
-            for data in data_list:
-                writer.writerow(data)
-
-        logging.info(f"Successfully saved {len(data_list)} records to CSV")
+        result = QuoteStore(csv_path).append([Quote.from_record(data) for data in data_list])
+        logging.info(
+            "Saved %d new quotes to CSV (%d unchanged, %d duplicates skipped)",
+            result["written"],
+            result["heartbeats"],
+            result["duplicates"],
+        )
 
     except PermissionError:
         logging.error(
-            f"Permission denied: Unable to write to {csv_path}. Check file permissions."
+            "Permission denied: Unable to write to %s. Check file permissions.", csv_path
         )
     except IOError as e:
-        logging.error(f"IO Error when writing to CSV: {str(e)}")
+        logging.error("IO Error when writing to CSV: %s", e)
     except Exception as e:
-        logging.error(f"Unexpected error when saving to CSV: {str(e)}", exc_info=True)
-
-    # Verify if the file was actually written
-    if os.path.exists(csv_path):
-        logging.info(f"CSV file found at {csv_path}")
-        # Log the file size
-        file_size = os.path.getsize(csv_path)
-        logging.info(f"CSV file size: {file_size} bytes")
-
-        # Log the last few lines of the file
-        try:
-            with open(csv_path, "r", encoding="utf-8") as f:
-                last_lines = f.readlines()[-5:]  # Get last 5 lines
-                logging.info("Last few lines of the CSV:")
-                for line in last_lines:
-                    logging.info(line.strip())
-        except Exception as e:
-            logging.error(f"Error reading CSV file: {str(e)}")
-    else:
-        logging.error(f"CSV file not found at {csv_path} after attempting to write")
-
-    # Try to write to a different location if the original fails
-    if not os.path.exists(csv_path):
-        alt_path = os.path.join(os.path.expanduser("~"), csv_filename)
-        logging.info(f"Attempting to write to alternative location: {alt_path}")
-        try:
-            with open(alt_path, "a", newline="", encoding="utf-8") as csvfile:
-                fieldnames = [
-                    "collection_time",
-                    "exchange_date",
-                    "buy_rate",
-                    "sell_rate",
-                    "source",
-                    "status",
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                if csvfile.tell() == 0:
-                    writer.writeheader()
-                for data in data_list:
-                    writer.writerow(data)
-            logging.info(f"Successfully wrote to alternative location: {alt_path}")
-        except Exception as e:
-            logging.error(f"Failed to write to alternative location: {str(e)}")
+        logging.error("Unexpected error when saving to CSV: %s", e, exc_info=True)
 
 
 def main():
@@ -0,0 +1 @@
+"""Shared building blocks for the arbolito collector and bots."""
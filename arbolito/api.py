@@ -0,0 +1,300 @@
+"""Read-only HTTP API over the collected quotes.
+
+Usage::
+
+    python -m arbolito.api --host 127.0.0.1 --port 8080
+
+Endpoints (all GET, JSON):
+
+* ``/latest``: last quote of every bank and currency
+* ``/latest/{source}``: same, for one bank (``bna``, ``ciudad``...)
+* ``/history?source=&from=&to=&currency=``: quotes of one bank between two
+  dates (inclusive, ``YYYY-MM-DD`` or ``dd/mm/yyyy``; anything else is a 400)
+
+Responses are served from an in-memory snapshot of the quotes file, built
+with the same loader the bots use and rebuilt only when the file changes.
+They carry strong ETags, honour ``If-None-Match`` with ``304 Not Modified``
+and are gzip-compressed when the client accepts it.
+"""
+
+import argparse
+import asyncio
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from arbolito.data import data_version, load_quotes
+from arbolito.logs import setup_logging
+from arbolito.quote import DEFAULT_CURRENCY, TIMESTAMP_FORMAT, parse_date
+from arbolito.store import QUOTES_PATH
+
+# Largest request body read and discarded to keep a connection alive
+MAX_DISCARDED_BODY = 64 * 1024
+
+_REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    503: "Service Unavailable",
+}
+
+
+class Response:
+    """Encoded JSON body with its ETag and a lazily built gzip variant"""
+
+    __slots__ = ("body", "etag", "_gzip_body")
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self._gzip_body = None
+
+    @property
+    def gzip_body(self):
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzip_body
+
+    @property
+    def gzip_etag(self):
+        return self.etag[:-1] + '-gz"'
+
+
+def _records(rows):
+    """Plain JSON-ready dicts for rows of the quote table"""
+    return [
+        {
+            "source": row.source,
+            "currency": row.currency,
+            "collection_time": row.collection_time.strftime(TIMESTAMP_FORMAT),
+            "exchange_date": row.exchange_date.isoformat() if row.exchange_date else None,
+            "buy_rate": row.buy_rate,
+            "sell_rate": row.sell_rate,
+        }
+        for row in rows
+    ]
+
+
+class Snapshot:
+    """Immutable in-memory view of the quotes file at one version"""
+
+    def __init__(self, table, version):
+        self.version = version
+
+        self.series = {}
+        for key in table.series():
+            self.series.setdefault(key[0], []).extend(_records(table.history(key)))
+        for records in self.series.values():
+            records.sort(key=lambda record: record["collection_time"])
+        self.times = {
+            source: [record["collection_time"] for record in records]
+            for source, records in self.series.items()
+        }
+
+        latest = _records(table.latest())
+        self.latest = Response(latest)
+        self.latest_by_source = {}
+        for source in self.series:
+            self.latest_by_source[source] = Response(
+                [record for record in latest if record["source"] == source]
+            )
+        self._history = OrderedDict()
+
+    def match_source(self, name):
+        """Resolve ``bna`` or ``ciudad`` to the stored source name, like the bots"""
+        name = name.strip().upper()
+        for source in self.series:
+            if source.upper() == name:
+                return source
+        for source in self.series:
+            if name and name in source.upper():
+                return source
+        return None
+
+    def history(self, source, start, end, currency, max_cached=256):
+        key = (source, start, end, currency)
+        response = self._history.get(key)
+        if response is not None:
+            self._history.move_to_end(key)
+            return response
+
+        times = self.times[source]
+        low = bisect.bisect_left(times, start) if start else 0
+        high = bisect.bisect_right(times, end) if end else len(times)
+        records = self.series[source][low:high]
+        if currency:
+            records = [record for record in records if record["currency"] == currency]
+        response = Response(records)
+
+        self._history[key] = response
+        if len(self._history) > max_cached:
+            self._history.popitem(last=False)
+        return response
+
+
+class QuoteAPI:
+    def __init__(self, path=QUOTES_PATH, refresh_interval=1.0):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def snapshot(self):
+        """Current snapshot, checking the file at most once per refresh interval"""
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return self._snapshot
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._snapshot
+            version = data_version(self.path)
+            if version is None:
+                self._snapshot = None
+            elif self._snapshot is None or self._snapshot.version != version:
+                table = await asyncio.to_thread(load_quotes, self.path)
+                self._snapshot = await asyncio.to_thread(Snapshot, table, version)
+                logging.info("Loaded quotes snapshot %s", version)
+            self._checked_at = time.monotonic()
+        return self._snapshot
+
+    async def route(self, method, target):
+        if method not in ("GET", "HEAD"):
+            return 405, Response({"error": "method not allowed"})
+        snapshot = await self.snapshot()
+        if snapshot is None:
+            return 503, Response({"error": "no quotes collected yet"})
+
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        if parts == ["latest"]:
+            return 200, snapshot.latest
+        if len(parts) == 2 and parts[0] == "latest":
+            source = snapshot.match_source(parts[1])
+            if source is None:
+                return 404, Response({"error": f"unknown source {parts[1]}"})
+            return 200, snapshot.latest_by_source[source]
+        if parts == ["history"]:
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if "source" not in query:
+                return 400, Response({"error": "source is required"})
+            source = snapshot.match_source(query["source"])
+            if source is None:
+                return 404, Response({"error": f"unknown source {query['source']}"})
+            try:
+                start = parse_date(query["from"]).isoformat() if query.get("from") else ""
+                end = parse_date(query["to"]).isoformat() + " 23:59:59" if query.get("to") else ""
+            except ValueError as e:
+                return 400, Response({"error": str(e)})
+            currency = query.get("currency", DEFAULT_CURRENCY).upper()
+            return 200, snapshot.history(source, start, end, currency)
+        return 404, Response({"error": "not found"})
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                # A body left in the stream would be read as the next request
+                keep_alive = await self._discard_body(reader, headers)
+
+                status, response = await self.route(method, target)
+                writer.write(self._encode(method, status, response, headers))
+                await writer.drain()
+
+                connection = headers.get("connection", "").lower()
+                if connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive"):
+                    break
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _discard_body(reader, headers):
+        """Skip the request body; False when the connection must be closed instead.
+
+        Small ``Content-Length`` bodies are read and dropped. Chunked,
+        oversized or malformed ones are not parsed: the connection is
+        closed after the response.
+        """
+        if "transfer-encoding" in headers:
+            return False
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return False
+        if length < 0 or length > MAX_DISCARDED_BODY:
+            return False
+        if length:
+            await reader.readexactly(length)
+        return True
+
+    @staticmethod
+    def _encode(method, status, response, headers):
+        use_gzip = "gzip" in headers.get("accept-encoding", "")
+        etag = response.gzip_etag if use_gzip else response.etag
+        body = response.gzip_body if use_gzip else response.body
+
+        if status == 200 and etag in (
+            tag.strip() for tag in headers.get("if-none-match", "").split(",")
+        ):
+            status, body = 304, b""
+
+        lines = [
+            f"HTTP/1.1 {status} {_REASONS[status]}",
+            "Content-Type: application/json; charset=utf-8",
+            f"ETag: {etag}",
+            "Cache-Control: no-cache",
+            "Vary: Accept-Encoding",
+        ]
+        if use_gzip and status != 304:
+            lines.append("Content-Encoding: gzip")
+        lines.append(f"Content-Length: {len(body) if status != 304 else 0}")
+        payload = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        return payload if method == "HEAD" or status == 304 else payload + body
+
+
+async def serve(host="127.0.0.1", port=8080, path=QUOTES_PATH):
+    api = QuoteAPI(path)
+    server = await asyncio.start_server(api.handle, host, port)
+    logging.info("Quote API listening on http://%s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-only HTTP API over the quotes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default=QUOTES_PATH)
+    args = parser.parse_args(argv)
+
+    setup_logging(log_file=None)
+    asyncio.run(serve(args.host, args.port, args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Backfill historical quotes into the quote store.
+
+Usage::
+
+    python -m arbolito.backfill --from 2024-01-01 --to 2024-12-31
+    python -m arbolito.backfill --from 2024-01-01 --to 2024-01-31 \\
+        --base-url http://127.0.0.1:8000      # against a local fixture server
+
+The range is split into chunks of ``--chunk-days`` days fetched by a pool of
+workers. Requests to one host go through a shared token bucket. Finished
+chunks are recorded in a checkpoint file, so an interrupted run resumes with
+the chunks still missing (``--restart`` ignores it). Quotes are bulk-loaded
+with ``QuoteStore.load_history``, which skips dates already stored.
+
+Backfilled rows carry the exchange date at midnight as collection time.
+They land behind the watermarks of the rollups and rolling stats, so a
+backfill that wrote rows rebuilds both from the store afterwards.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from arbolito.health import backoff_delay
+from arbolito.lazy import lazy_import
+from arbolito.logs import setup_logging
+from arbolito.quote import Quote, parse_currency, parse_date
+from arbolito.ratelimit import KeyedLimiter
+from arbolito.rollups import ROLLUPS_PATH, Rollups
+from arbolito.stats import STATS_PATH, RollingStats
+from arbolito.store import QUOTES_PATH, QuoteStore
+
+BNA_BASE_URL = "https://www.bna.com.ar"
+
+
+class _TableParser(HTMLParser):
+    """Collects the text of every ``<td>``/``<th>`` cell, row by row"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._row:
+                self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_bna_history(html):
+    """Quotes from a BNA ``HistoricoPrincipales`` page (Moneda, Compra, Venta, Fecha)"""
+    parser = _TableParser()
+    parser.feed(html)
+    quotes = []
+    for row in parser.rows:
+        if len(row) < 4:
+            continue
+        currency = parse_currency(row[0])
+        if currency is None:
+            continue
+        try:
+            exchange_date = parse_date(row[3])
+            quotes.append(
+                Quote.success(
+                    "BNA",
+                    row[1],
+                    row[2],
+                    exchange_date,
+                    datetime.combine(exchange_date, datetime.min.time()),
+                    currency,
+                )
+            )
+        except ValueError:
+            continue
+    return quotes
+
+
+def bna_history_url(base_url, day):
+    return (
+        f"{base_url.rstrip('/')}/Cotizador/HistoricoPrincipales"
+        f"?id=billetes&fecha={day:%d/%m/%Y}&filtroEuro=1&filtroDolar=1"
+    )
+
+
+# Backfill adapters: name -> (url for one day, page parser)
+SOURCES = {
+    "bna": (bna_history_url, parse_bna_history),
+}
+
+
+def chunks(start, end, days):
+    """Split ``start``..``end`` (inclusive) into ``(first, last)`` day ranges"""
+    result = []
+    first = start
+    while first <= end:
+        last = min(end, first + timedelta(days=days - 1))
+        result.append((first, last))
+        first = last + timedelta(days=1)
+    return result
+
+
+class Backfill:
+    def __init__(
+        self,
+        source="bna",
+        base_url=BNA_BASE_URL,
+        store=None,
+        checkpoint_path=None,
+        workers=4,
+        rate=2.0,
+        timeout=15,
+        max_retries=3,
+    ):
+        self.url_for, self.parse = SOURCES[source]
+        self.source = source
+        self.base_url = base_url
+        self.store = store or QuoteStore(os.path.abspath(QUOTES_PATH))
+        data_dir = os.path.dirname(self.store.path)
+        self.checkpoint_path = checkpoint_path or os.path.join(
+            data_dir, f"backfill_{source}.checkpoint.json"
+        )
+        self.rollups_path = os.path.join(data_dir, os.path.basename(ROLLUPS_PATH))
+        self.stats_path = os.path.join(data_dir, os.path.basename(STATS_PATH))
+        self.workers = workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Per-host budget shared by every worker
+        self.limiter = KeyedLimiter(rate=rate, capacity=max(1, int(rate)))
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return set(json.load(f)["done"])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return set()
+
+    def _save_checkpoint(self, done):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "done": sorted(done)}, f, indent=1)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def fetch_day(self, day):
+        requests = lazy_import("requests")
+        url = self.url_for(self.base_url, day)
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries):
+            self.limiter.acquire(host)
+            try:
+                response = requests.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                return self.parse(response.text)
+            except requests.RequestException as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                logging.warning(
+                    "Backfill %s %s failed (%s), retrying",
+                    self.source,
+                    day,
+                    e,
+                    extra={"source": self.source, "phase": "backfill"},
+                )
+                time.sleep(backoff_delay(attempt, base=1.0))
+
+    def fetch_chunk(self, first, last):
+        """Quotes published for the days of one chunk"""
+        quotes = []
+        day = first
+        while day <= last:
+            quotes.extend(
+                quote for quote in self.fetch_day(day) if first <= quote.exchange_date <= last
+            )
+            day += timedelta(days=1)
+        return quotes
+
+    def refresh_aggregates(self):
+        """Rebuild the rollups and rolling stats to include backfilled days"""
+        for aggregate in (
+            Rollups(self.rollups_path, self.store.path, rebuild=True),
+            RollingStats(self.stats_path, self.store.path, rebuild=True),
+        ):
+            aggregate.save()
+        logging.info(
+            "Rebuilt %s and %s with the backfilled history",
+            self.rollups_path,
+            self.stats_path,
+            extra={"source": self.source, "phase": "backfill"},
+        )
+
+    def run(self, start, end, chunk_days=7, restart=False):
+        """Backfill ``start``..``end``; returns the number of rows written"""
+        done = set() if restart else self._load_checkpoint()
+        pending = [
+            (first, last)
+            for first, last in chunks(start, end, chunk_days)
+            if f"{first}..{last}" not in done
+        ]
+        logging.info(
+            "Backfilling %s from %s to %s: %d chunks to fetch, %d already done",
+            self.source,
+            start,
+            end,
+            len(pending),
+            len(done),
+            extra={"source": self.source, "phase": "backfill"},
+        )
+
+        written = failed = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.fetch_chunk, *chunk): chunk for chunk in pending}
+            for future in as_completed(futures):
+                first, last = futures[future]
+                try:
+                    quotes = future.result()
+                except Exception as e:
+                    failed += 1
+                    logging.error(
+                        "Backfill chunk %s..%s failed: %s",
+                        first,
+                        last,
+                        e,
+                        extra={"source": self.source, "phase": "backfill"},
+                    )
+                    continue
+                # Load before checkpointing: a crash in between only reloads
+                # the chunk, and load_history skips what is already stored
+                written += len(self.store.load_history(quotes))
+                done.add(f"{first}..{last}")
+                self._save_checkpoint(done)
+
+        elapsed = time.perf_counter() - started
+        logging.info(
+            "Backfill wrote %d rows in %.1f s (%.0f rows/s), %d chunks failed",
+            written,
+            elapsed,
+            written / elapsed if elapsed else 0.0,
+            failed,
+            extra={"source": self.source, "phase": "backfill", "duration_ms": round(elapsed * 1000, 1)},
+        )
+        if written:
+            self.refresh_aggregates()
+        return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill historical quotes")
+    parser.add_argument("--source", choices=sorted(SOURCES), default="bna")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--base-url", default=BNA_BASE_URL)
+    parser.add_argument("--path", default=QUOTES_PATH)
+    parser.add_argument("--chunk-days", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="requests per second per host")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    args = parser.parse_args(argv)
+
+    setup_logging("log/backfill_log.log")
+    backfill = Backfill(
+        args.source,
+        args.base_url,
+        QuoteStore(os.path.abspath(args.path)),
+        workers=args.workers,
+        rate=args.rate,
+    )
+    backfill.run(args.start, args.end, args.chunk_days, args.restart)
+
+
+if __name__ == "__main__":
+    main()
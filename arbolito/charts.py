@@ -0,0 +1,128 @@
+import asyncio
+import io
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from arbolito.lazy import lazy_import
+from arbolito.rollups import DAY
+
+
+def render_chart(series, title):
+    """PNG bytes of a line chart of daily sell closes.
+
+    ``series`` maps a source name to ``[(day, close, low, high), ...]``.
+    Runs in a worker process, so matplotlib is only imported there.
+    """
+    matplotlib = lazy_import("matplotlib")
+    matplotlib.use("Agg")
+    pyplot = lazy_import("matplotlib.pyplot")
+
+    figure, axes = pyplot.subplots(figsize=(8, 4.5), dpi=100)
+    for source, points in series.items():
+        # Monthly buckets are keyed "YYYY-MM"
+        days = [
+            datetime.strptime(point[0] if len(point[0]) == 10 else point[0] + "-01", "%Y-%m-%d")
+            for point in points
+        ]
+        axes.plot(days, [point[1] for point in points], label=source, linewidth=1.6)
+        axes.fill_between(
+            days, [point[2] for point in points], [point[3] for point in points], alpha=0.15
+        )
+    axes.set_title(title)
+    axes.set_ylabel("Venta ($)")
+    axes.grid(alpha=0.3)
+    axes.legend(loc="upper left")
+    figure.autofmt_xdate()
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    pyplot.close(figure)
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """Renders charts in a process pool and keeps the latest ones.
+
+    Entries are keyed by (sources, currency, days, rollups version), so a
+    new collection naturally invalidates them. Each entry keeps the PNG and,
+    once sent, the Telegram ``file_id`` of the upload, which lets repeated
+    requests be answered without rendering or uploading again. Identical
+    requests arriving while a chart renders share the same render.
+    """
+
+    def __init__(self, max_entries=32, workers=1):
+        self.max_entries = max_entries
+        self.workers = workers
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def render(self, key, series, title):
+        """Cache entry for ``key``, rendering it in the pool when missing"""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._render(series, title))
+        try:
+            png = await asyncio.shield(pending)
+        finally:
+            self._pending.pop(key, None)
+
+        entry = self._entries.get(key) or {"png": png, "file_id": None}
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def _render(self, series, title):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            png = await loop.run_in_executor(self._executor(), render_chart, series, title)
+        except BrokenProcessPool:
+            # A worker died (out of memory, killed); start a new pool next time
+            self._pool = None
+            raise
+        elapsed = (time.perf_counter() - start) * 1000
+        logging.info(
+            "Rendered chart %r in %.1f ms",
+            title,
+            elapsed,
+            extra={"phase": "chart", "duration_ms": round(elapsed, 1)},
+        )
+        return png
+
+
+def chart_series(rollups, sources, currency, days):
+    """Picklable daily points of ``sources`` for the last ``days`` days"""
+    series = {}
+    for source in sources:
+        tier = DAY if days <= 366 else None
+        _, buckets = rollups.history(source, currency, days, tier=tier)
+        if buckets:
+            series[source] = [
+                (key, bucket["close"], bucket["low"], bucket["high"]) for key, bucket in buckets
+            ]
+    return series
+
+
+CHARTS = ChartCache()
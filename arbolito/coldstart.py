@@ -0,0 +1,118 @@
+"""Measure bot cold start: import, first load and first query, with RSS.
+
+Usage::
+
+    python -m arbolito.coldstart                          # table vs pandas
+    python -m arbolito.coldstart --module run_telegram_bot --repeat 5
+
+Every run happens in a fresh interpreter. ``table`` is the query layer the
+bots use (``arbolito.data``); ``pandas`` is the DataFrame path they used
+before (``read_csv``, sort, ``groupby().tail(1)``), skipped when pandas is
+not installed. ``--module`` also times importing a whole bot module.
+"""
+
+import argparse
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+
+from arbolito.store import QUOTES_PATH
+
+_PRELUDE = """
+import json, resource, sys, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+started = time.perf_counter()
+"""
+
+_SCENARIOS = {
+    "table": """
+from arbolito.data import load_quotes
+imported = time.perf_counter()
+table = load_quotes(PATH)
+loaded = time.perf_counter()
+rows = table.latest("USD")
+""",
+    "pandas": """
+import pandas as pd
+imported = time.perf_counter()
+df = pd.read_csv(PATH)
+df["collection_time"] = pd.to_datetime(df["collection_time"])
+df = df.sort_values("collection_time", kind="stable")
+loaded = time.perf_counter()
+rows = list(df.groupby(["source", "currency"], sort=False).tail(1).iterrows())
+""",
+    "module": """
+import importlib
+importlib.import_module(MODULE)
+imported = time.perf_counter()
+from arbolito.data import load_quotes
+table = load_quotes(PATH)
+loaded = time.perf_counter()
+rows = table.latest("USD")
+""",
+}
+
+_REPORT = """
+queried = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "load_ms": (loaded - imported) * 1000,
+    "query_ms": (queried - loaded) * 1000,
+    "rss_mb": rss_mb(),
+    "rows": len(rows),
+}))
+"""
+
+
+def measure(scenario, path=QUOTES_PATH, module=None):
+    """Run one scenario in a new interpreter; returns its timings and RSS"""
+    code = (
+        f"PATH = {path!r}\nMODULE = {module!r}\n"
+        + _PRELUDE
+        + _SCENARIOS[scenario]
+        + _REPORT
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bot cold start time and memory")
+    parser.add_argument("--path", default=QUOTES_PATH)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--module", help="bot module to import as well (run_telegram_bot...)")
+    args = parser.parse_args(argv)
+
+    scenarios = ["table"]
+    if importlib.util.find_spec("pandas") is not None:
+        scenarios.append("pandas")
+    if args.module:
+        scenarios.append("module")
+
+    for scenario in scenarios:
+        runs = [measure(scenario, args.path, args.module) for _ in range(args.repeat)]
+        median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(
+            f"{scenario:>7}: import {median['import_ms']:7.1f} ms · "
+            f"load {median['load_ms']:7.1f} ms · first query {median['query_ms']:6.2f} ms · "
+            f"RSS {median['rss_mb']:6.1f} MB ({median['rows']:.0f} rows)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+"""Bot commands shared by both Telegram bots."""
+
+import asyncio
+import csv
+import gzip
+import io
+import logging
+import re
+import statistics
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+
+from arbolito.charts import CHARTS, chart_series
+from arbolito.data import apply_rows, cached_quotes, invalidate, load_quotes
+from arbolito.gds import iter_segments
+from arbolito.health import is_stale, load_health
+from arbolito.lookups import city_name
+from arbolito.quote import (
+    DEFAULT_CURRENCY,
+    FIELDNAMES,
+    TIMESTAMP_FORMAT,
+    parse_currency,
+    parse_date,
+)
+from arbolito.ratelimit import KeyedLimiter
+from arbolito.replies import cached_reply, format_quote, warm
+from arbolito.rollups import WEEK, load_rollups, summarize
+from arbolito.stats import WINDOWS, load_stats, window_for
+from arbolito.store import QuoteStore
+from arbolito.stream import Subscriber
+
+# "30d", "8s"/"8w" (semanas), "6m"; a bare number counts days
+_PERIOD_RE = re.compile(r"^(\d{1,4})([DSWM]?)$")
+_PERIOD_DAYS = {"": 1, "D": 1, "S": 7, "W": 7, "M": 30}
+
+# Three exports in a burst, then one every two minutes per user
+_EXPORT_LIMITS = KeyedLimiter(rate=1 / 120, capacity=3)
+# Exports running at once, across all users
+_EXPORT_SLOTS = asyncio.Semaphore(2)
+
+
+def match_series(series, bank, currency):
+    """Stored source name of ``bank`` ("bna", "ciudad"...) for ``currency``"""
+    sources = [key.split("|", 1)[0] for key in series if key.split("|", 1)[1] == currency]
+    for source in sources:
+        if source.upper() == bank:
+            return source
+    for source in sources:
+        if bank and bank in source.upper():
+            return source
+    return None
+
+
+def parse_history_args(args):
+    """(bank, currency, days) from ``/historial BNA EUR 30d`` arguments"""
+    bank, currency, days = [], DEFAULT_CURRENCY, 30
+    for word in (arg.upper() for arg in args):
+        period = _PERIOD_RE.match(word)
+        code = parse_currency(word)
+        if period:
+            days = int(period.group(1)) * _PERIOD_DAYS[period.group(2)]
+        elif code:
+            currency = code
+        else:
+            bank.append(word)
+    return " ".join(bank), currency, max(1, min(days, 3660))
+
+
+async def historial(update: Update, context):
+    """/historial BNA 30d: evolution of a bank's rate from the rollups"""
+    bank, currency, days = parse_history_args(context.args or [])
+    logging.info("Historial de %s %s, %d días", bank, currency, days)
+    if not bank:
+        await update.message.reply_text(
+            "Indique el banco y el período, por ejemplo /historial BNA 30d "
+            "(d: días, s: semanas, m: meses)."
+        )
+        return
+
+    rollups = load_rollups()
+    source = match_series(rollups.series(), bank, currency) if rollups else None
+    moneda = "" if currency == DEFAULT_CURRENCY else f" ({currency})"
+    if source is None:
+        await update.message.reply_text(f"No hay historial para {bank}{moneda}.")
+        return
+
+    tier, buckets = rollups.history(source, currency, days)
+    if not buckets:
+        await update.message.reply_text(
+            f"No hay cotizaciones de {source}{moneda} en los últimos {days} días."
+        )
+        return
+
+    total = summarize([bucket for _, bucket in buckets])
+    change = (total["close"] / total["open"] - 1) * 100
+    lines = [
+        f"📈 {source}{moneda}, últimos {days} días (venta)",
+        f"Apertura ${total['open']:.2f} → cierre ${total['close']:.2f} ({change:+.2f}%)",
+        f"🔺 Máximo ${total['high']:.2f} · 🔻 Mínimo ${total['low']:.2f}",
+        f"Promedio ${total['mean']:.2f} · spread medio ${total['spread']:.2f} "
+        f"· {total['count']} muestras",
+        "",
+    ]
+    for key, bucket in buckets:
+        label = f"sem. {key}" if tier == WEEK else key
+        lines.append(
+            f"{label}: ${bucket['close']:.2f} ({bucket['low']:.2f} – {bucket['high']:.2f})"
+        )
+    await update.message.reply_text("\n".join(lines))
+
+
+async def _rolling_summary(update, context, command):
+    """(source, moneda, window, summary) for /promedio and /volatilidad, or None after replying"""
+    bank, currency, days = parse_history_args(context.args or [])
+    window = window_for(days)
+    logging.info("%s de %s %s, ventana %s", command, bank, currency, window)
+    if not bank:
+        await update.message.reply_text(
+            f"Indique el banco y el período, por ejemplo /{command} BNA 7d "
+            "(ventanas de 1, 7 y 30 días)."
+        )
+        return None
+
+    stats = load_stats()
+    source = match_series(stats.series, bank, currency) if stats else None
+    moneda = "" if currency == DEFAULT_CURRENCY else f" ({currency})"
+    summary = stats.summary(source, currency, window) if source else None
+    if summary is None:
+        await update.message.reply_text(f"No hay cotizaciones recientes de {bank}{moneda}.")
+        return None
+    return source, moneda, window, summary
+
+
+async def promedio(update: Update, context):
+    """/promedio BNA 7d: rolling mean and EWMA of the sell rate"""
+    result = await _rolling_summary(update, context, "promedio")
+    if result is None:
+        return
+    source, moneda, window, summary = result
+    await update.message.reply_text(
+        f"📊 {source}{moneda}, últimos {WINDOWS[window] // 86400} días (venta)\n"
+        f"Promedio ${summary['mean']:.2f} · promedio ponderado ${summary['ewma']:.2f}\n"
+        f"Último ${summary['last']:.2f} · {summary['count']} muestras"
+    )
+
+
+async def volatilidad(update: Update, context):
+    """/volatilidad BNA 30d: rolling standard deviation and range of the sell rate"""
+    result = await _rolling_summary(update, context, "volatilidad")
+    if result is None:
+        return
+    source, moneda, window, summary = result
+    variation = summary["std"] / summary["mean"] * 100 if summary["mean"] else 0.0
+    await update.message.reply_text(
+        f"📉 {source}{moneda}, últimos {WINDOWS[window] // 86400} días (venta)\n"
+        f"Desvío estándar ${summary['std']:.2f} ({variation:.2f}% del promedio)\n"
+        f"🔺 Máximo ${summary['max']:.2f} · 🔻 Mínimo ${summary['min']:.2f} "
+        f"· rango ${summary['max'] - summary['min']:.2f}\n"
+        f"{summary['count']} muestras"
+    )
+
+
+async def grafico(update: Update, context):
+    """/grafico BNA CIUDAD 90d: chart of the daily sell close, cached"""
+    words = [arg.upper() for arg in context.args or []]
+    banks, currency, days = [], DEFAULT_CURRENCY, 90
+    for word in words:
+        period = _PERIOD_RE.match(word)
+        code = parse_currency(word)
+        if period:
+            days = max(1, min(int(period.group(1)) * _PERIOD_DAYS[period.group(2)], 3660))
+        elif code:
+            currency = code
+        else:
+            banks.append(word)
+
+    rollups = load_rollups()
+    if rollups is None:
+        await update.message.reply_text("Todavía no hay historial para graficar.")
+        return
+    if not banks or "TODOS" in banks:
+        sources = [key.split("|", 1)[0] for key in rollups.series() if key.endswith("|" + currency)]
+    else:
+        sources = [match_series(rollups.series(), bank, currency) for bank in banks]
+        sources = [source for source in dict.fromkeys(sources) if source]
+    moneda = "" if currency == DEFAULT_CURRENCY else f" ({currency})"
+    if not sources:
+        await update.message.reply_text(f"No hay historial para {' '.join(banks)}{moneda}.")
+        return
+
+    key = (tuple(sorted(sources)), currency, days, rollups.version)
+    entry = CHARTS.get(key)
+    if entry is None:
+        series = chart_series(rollups, sources, currency, days)
+        if not series:
+            await update.message.reply_text(
+                f"No hay cotizaciones{moneda} en los últimos {days} días."
+            )
+            return
+        title = f"{', '.join(series)}{moneda}, últimos {days} días"
+        try:
+            entry = await CHARTS.render(key, series, title)
+        except Exception as e:
+            logging.error("Failed to render chart %r: %s", title, e, exc_info=True)
+            await update.message.reply_text(
+                "No se pudo generar el gráfico, probá de nuevo en unos minutos."
+            )
+            return
+
+    if entry["file_id"]:
+        await update.message.reply_photo(entry["file_id"])
+        return
+    message = await update.message.reply_photo(entry["png"])
+    entry["file_id"] = message.photo[-1].file_id
+
+
+async def mejor(update: Update, context):
+    """/mejor [moneda]: where to buy and sell cheapest right now"""
+    currency = next(
+        (code for code in map(parse_currency, context.args or []) if code), DEFAULT_CURRENCY
+    )
+    moneda = "" if currency == DEFAULT_CURRENCY else f" ({currency})"
+    quotes = load_quotes()
+    reply = cached_reply(quotes, "mejor", None, currency) if quotes is not None else None
+    await update.message.reply_text(reply or f"No hay cotizaciones{moneda} para comparar.")
+
+
+def _ago(timestamp, now):
+    """How long ago a stored timestamp was, in Spanish ("hace 5 min")"""
+    if not timestamp:
+        return "nunca"
+    minutes = int((now - datetime.strptime(timestamp, TIMESTAMP_FORMAT)).total_seconds() // 60)
+    if minutes < 60:
+        return f"hace {max(minutes, 0)} min"
+    if minutes < 48 * 60:
+        return f"hace {minutes // 60} h {minutes % 60} min"
+    return f"hace {minutes // (24 * 60)} días"
+
+
+def format_status(sources, now=None):
+    """/estado reply: freshness and health of every source"""
+    now = now or datetime.now()
+    lines = ["🩺 Estado de las fuentes", ""]
+    for source, entry in sorted(sources.items()):
+        failures = entry.get("consecutive_failures", 0)
+        icon = "❌" if failures else "⚠️" if is_stale(entry, now) else "✅"
+        details = [f"último dato {_ago(entry.get('last_success'), now)}"]
+        if entry.get("last_latency_ms") is not None:
+            details.append(f"{entry['last_latency_ms'] / 1000:.1f} s")
+        if entry.get("backend"):
+            details.append(entry["backend"])
+        lines.append(f"{icon} {source}: " + " · ".join(details))
+        if failures:
+            lines.append(
+                f"    {failures} fallo(s) seguidos, el último {_ago(entry.get('last_failure'), now)} "
+                f"({entry.get('last_error_class') or 'error'})"
+            )
+        if entry.get("open_until") and entry["open_until"] > now.strftime(TIMESTAMP_FORMAT):
+            lines.append(f"    en pausa hasta {entry['open_until'][11:16]}")
+    return "\n".join(lines)
+
+
+async def estado(update: Update, context):
+    """/estado: data freshness and collector health per bank"""
+    sources = load_health()
+    if not sources:
+        await update.message.reply_text("Todavía no hay datos del recolector.")
+        return
+    await update.message.reply_text(format_status(sources))
+
+
+class InlineIndex:
+    """Result cards of the latest quote of every bank, for inline queries.
+
+    Built from the in-memory quote table when the change stream delivers a
+    collection, so answering a query is a filter over a short list and
+    never touches the CSV. Only the first query, or the first after a
+    stream reset, loads the table (in a worker thread). ``cache_time``
+    tells Telegram to keep an answer until about when the next collection
+    is due.
+    """
+
+    # Assumed gap between collections until the stream has shown two
+    DEFAULT_INTERVAL = 15 * 60
+
+    def __init__(self):
+        self.cards = None
+        # Quote table version the cards were built from
+        self.version = None
+        self.batches = deque(maxlen=8)
+
+    def rebuild(self, quotes):
+        self.version = quotes.version if quotes is not None else None
+        cards = []
+        for row in quotes.latest() if quotes is not None else []:
+            moneda = "" if row.currency == DEFAULT_CURRENCY else f" ({row.currency})"
+            cards.append(
+                (
+                    row.source.upper(),
+                    row.currency,
+                    InlineQueryResultArticle(
+                        id=f"{row.source}|{row.currency}"[:64],
+                        title=f"{row.source}{moneda}",
+                        description=(
+                            f"Compra ${row.buy_rate} · Venta ${row.sell_rate} "
+                            f"({row.collection_time:%d/%m %H:%M})"
+                        ),
+                        input_message_content=InputTextMessageContent(format_quote(row)),
+                    ),
+                )
+            )
+        # Dollar first: what most inline queries are after
+        cards.sort(key=lambda card: (card[1] != DEFAULT_CURRENCY, card[0], card[1]))
+        self.cards = cards
+
+    def clear(self):
+        self.cards = None
+        self.version = None
+
+    def note_batch(self):
+        self.batches.append(time.monotonic())
+
+    def interval(self):
+        gaps = [later - earlier for earlier, later in zip(self.batches, list(self.batches)[1:])]
+        return statistics.median(gaps) if gaps else self.DEFAULT_INTERVAL
+
+    def cache_time(self):
+        """Seconds until the next collection is expected, at least one minute"""
+        if not self.batches:
+            return 60
+        due = self.batches[-1] + self.interval() - time.monotonic()
+        return int(max(60, min(due, self.interval())))
+
+    def search(self, query, limit=50):
+        words = query.upper().split()
+        currencies = {code for code in map(parse_currency, words) if code}
+        banks = [word for word in words if not parse_currency(word) and word != "TODOS"]
+        return [
+            card
+            for bank_name, currency, card in self.cards or []
+            if (not currencies or currency in currencies)
+            and (not banks or any(bank in bank_name for bank in banks))
+        ][:limit]
+
+
+INLINE = InlineIndex()
+
+
+async def inline_quotes(update: Update, context):
+    """Inline mode (``@ArbolitoV2_bot bna eur``): latest quote cards"""
+    query = update.inline_query.query
+    if INLINE.cards is None:
+        # First query, or the stream was reset: read the file off the event loop
+        INLINE.rebuild(await asyncio.to_thread(load_quotes))
+    await update.inline_query.answer(
+        INLINE.search(query), cache_time=INLINE.cache_time(), is_personal=False
+    )
+
+
+async def follow_changes(application):
+    """``post_init`` hook: keep the cached quotes current from the change stream"""
+
+    def on_batch(batch, replay=False):
+        added = apply_rows(batch.get("rows", []))
+        logging.info("Change stream: %d new quotes applied", added)
+        if not replay:
+            # Replayed batches arrive in a burst and say nothing of the schedule
+            INLINE.note_batch()
+        # apply_rows brought the cached table up to date; without one the
+        # next inline query loads it in a thread
+        quotes = cached_quotes()
+        if quotes is None:
+            INLINE.clear()
+        elif added or quotes.version != INLINE.version:
+            warm(quotes)
+            INLINE.rebuild(quotes)
+
+    def on_reset():
+        invalidate()
+        INLINE.clear()
+
+    subscriber = Subscriber(on_batch, on_reset=on_reset)
+    application.bot_data["change_stream"] = subscriber
+    application.create_task(subscriber.run())
+
+
+def build_export(source=None, currency=None, start=None, end=None, chunk_rows=2000):
+    """Gzipped CSV of the matching quotes, streamed from the store.
+
+    Rows are read from the store's day index and written in chunks into a
+    spooled temporary file, which only moves to disk past 4 MB, so memory
+    stays bounded whatever the range. Returns ``(file, row count)`` with the
+    file rewound; the caller closes it.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+    count = 0
+    with gzip.GzipFile(fileobj=spool, mode="wb", mtime=0) as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+        writer = csv.DictWriter(text, fieldnames=FIELDNAMES, extrasaction="ignore")
+        writer.writeheader()
+        chunk = []
+        for row in QuoteStore().iter_rows(start, end):
+            row["currency"] = row.get("currency") or DEFAULT_CURRENCY
+            if (source and row["source"] != source) or (currency and row["currency"] != currency):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                writer.writerows(chunk)
+                count += len(chunk)
+                chunk.clear()
+        writer.writerows(chunk)
+        count += len(chunk)
+        text.flush()
+        text.detach()
+    spool.seek(0)
+    return spool, count
+
+
+async def exportar(update: Update, context):
+    """/exportar [banco] [moneda] [desde] [hasta]: quotes as a .csv.gz document"""
+    banks, currency, dates = [], None, []
+    for word in (arg.upper() for arg in context.args or []):
+        try:
+            dates.append(parse_date(word))
+            continue
+        except ValueError:
+            pass
+        code = parse_currency(word)
+        if code:
+            currency = code
+        else:
+            banks.append(word)
+    start = dates[0] if dates else None
+    end = dates[1] if len(dates) > 1 else None
+    bank = " ".join(banks)
+
+    source = None
+    if bank and bank != "TODOS":
+        series = QuoteStore().last_values()
+        source = match_series(series, bank, currency or DEFAULT_CURRENCY)
+        if source is None:
+            await update.message.reply_text(f"No hay cotizaciones para {bank}.")
+            return
+
+    # Only a valid request costs a token, so a typo does not use up the quota
+    wait = _EXPORT_LIMITS.try_acquire(update.effective_user.id)
+    if wait:
+        await update.message.reply_text(
+            f"Demasiadas exportaciones seguidas, intente de nuevo en {wait:.0f} segundos."
+        )
+        return
+
+    logging.info("Exportando %s %s %s-%s", source or "TODOS", currency or "", start, end)
+    async with _EXPORT_SLOTS:
+        document, count = await asyncio.to_thread(build_export, source, currency, start, end)
+    with document:
+        if count == 0:
+            await update.message.reply_text("No hay cotizaciones en ese rango.")
+            return
+        parts = ["cotizaciones", (source or "todos").replace(" ", "_").lower()]
+        parts += [str(part).lower() for part in (currency, start, end) if part]
+        name = "_".join(parts)
+        await update.message.reply_document(
+            document=document, filename=f"{name}.csv.gz", caption=f"{count} cotizaciones"
+        )
+
+
+def _place(code):
+    try:
+        city = city_name(code)
+    except (ImportError, OSError):  # no compiled cache and no openpyxl
+        city = None
+    except ValueError as e:  # sheet without the expected header
+        logging.warning("City lookup unavailable: %s", e)
+        city = None
+    return f"{code} ({city})" if city else code
+
+
+async def itinerario(update: Update, context):
+    """/itinerario followed by pasted GDS segment lines: readable itinerary"""
+    # Drop the command itself; segments may follow on the same or next lines
+    text = update.message.text
+    text = text[len(text.split(maxsplit=1)[0]) :]
+    segments = list(iter_segments(text.splitlines()))
+    if not segments:
+        await update.message.reply_text(
+            "Pegue las líneas del itinerario después del comando, por ejemplo:\n"
+            "/itinerario 7  AR1132 G 10APR 4*EZEMAD DK2  2355 1710  11APR  E  0 330 DB"
+        )
+        return
+
+    lines = []
+    for segment in segments:
+        arrival = segment.arrival_date or segment.departure_date
+        line = (
+            f"{segment.number}. ✈️ {segment.airline} {segment.flight} "
+            f"{_place(segment.origin)} → {_place(segment.destination)}\n"
+            f"   Sale {segment.departure_date:%d/%m} {segment.departure_time:%H:%M}, "
+            f"llega {arrival:%d/%m} {segment.arrival_time:%H:%M}\n"
+            f"   Clase {segment.booking_class} · {segment.status} ({segment.status_text}) "
+            f"· {segment.party_size} pax"
+        )
+        if segment.record_locator:
+            line += f" · reserva {segment.record_locator}"
+        lines.append(line)
+    await update.message.reply_text("\n\n".join(lines))
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from arbolito.health import STALE_AFTER
+from arbolito.lazy import lazy_import
+from arbolito.quote import TIMESTAMP_FORMAT
+
+COMPARISON_PATH = os.path.join("data", "comparison.json")
+
+# Every bank is compared against the Banco Nación rate of the same currency
+REFERENCE_SOURCE = "BNA"
+
+_cache = {}
+
+
+def build_comparison(last_values, reference=REFERENCE_SOURCE, now=None, max_age=STALE_AFTER):
+    """Cross-bank comparison of the latest rate of every series.
+
+    ``last_values`` is the store's last-value index (``"BNA|USD"`` ->
+    entry). Rates are laid out as source x currency matrices, so the best
+    prices, spreads and deviations from ``reference`` are computed for all
+    currencies at once. "best_buy" is where buying the currency is cheapest
+    (lowest bank sell rate), "best_sell" where selling it pays most (highest
+    bank buy rate).
+
+    A bank whose rate was last seen more than ``max_age`` seconds before
+    ``now`` is listed with ``"stale": true`` but never named the best: its
+    scraper may have been down for hours while the others moved.
+    """
+    np = lazy_import("numpy")
+    keys = [key.split("|", 1) for key in last_values]
+    sources = sorted({source for source, _ in keys})
+    currencies = sorted({currency for _, currency in keys})
+    row = {source: i for i, source in enumerate(sources)}
+    column = {currency: j for j, currency in enumerate(currencies)}
+
+    now = now or datetime.now()
+    oldest = (now - timedelta(seconds=max_age)).strftime(TIMESTAMP_FORMAT)
+    buy = np.full((len(sources), len(currencies)), np.nan)
+    sell = np.full_like(buy, np.nan)
+    stale = np.zeros(buy.shape, dtype=bool)
+    for (source, currency), entry in zip(keys, last_values.values()):
+        i, j = row[source], column[currency]
+        buy[i, j] = float(entry["buy_rate"]) if entry["buy_rate"] else np.nan
+        sell[i, j] = float(entry["sell_rate"]) if entry["sell_rate"] else np.nan
+        stale[i, j] = entry["seen_at"] < oldest
+
+    spread = sell - buy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        spread_pct = spread / sell * 100
+        if reference in row:
+            reference_sell = sell[row[reference]]
+            vs_reference_pct = (sell / reference_sell - 1) * 100
+        else:
+            vs_reference_pct = np.full_like(sell, np.nan)
+    # Stale rates take no part in the ranking
+    fresh_sell = np.where(stale, np.nan, sell)
+    fresh_buy = np.where(stale, np.nan, buy)
+    # nanarg* raise on all-NaN columns, so fill those with +-inf first
+    has_sell = ~np.isnan(fresh_sell).all(axis=0)
+    has_buy = ~np.isnan(fresh_buy).all(axis=0)
+    best_buy = np.argmin(np.where(np.isnan(fresh_sell), np.inf, fresh_sell), axis=0)
+    best_sell = np.argmax(np.where(np.isnan(fresh_buy), -np.inf, fresh_buy), axis=0)
+
+    def value(matrix, i, j, digits=2):
+        return None if np.isnan(matrix[i, j]) else round(float(matrix[i, j]), digits)
+
+    result = {}
+    for currency, j in column.items():
+        banks = {}
+        for source, i in row.items():
+            entry = last_values.get(f"{source}|{currency}")
+            if entry is None:
+                continue
+            banks[source] = {
+                "buy": value(buy, i, j),
+                "sell": value(sell, i, j),
+                "spread": value(spread, i, j),
+                "spread_pct": value(spread_pct, i, j),
+                "vs_reference_pct": value(vs_reference_pct, i, j),
+                "exchange_date": entry["exchange_date"],
+                "collection_time": entry["collection_time"],
+                "seen_at": entry["seen_at"],
+                "stale": bool(stale[i, j]),
+            }
+        result[currency] = {
+            "best_buy": (
+                {"source": sources[best_buy[j]], "rate": value(sell, best_buy[j], j)}
+                if has_sell[j]
+                else None
+            ),
+            "best_sell": (
+                {"source": sources[best_sell[j]], "rate": value(buy, best_sell[j], j)}
+                if has_buy[j]
+                else None
+            ),
+            "banks": banks,
+        }
+    return {
+        "generated_at": now.strftime(TIMESTAMP_FORMAT),
+        "reference": reference,
+        "currencies": result,
+    }
+
+
+def write_comparison(last_values, path=COMPARISON_PATH):
+    """Compute the comparison and persist it atomically"""
+    comparison = build_comparison(last_values)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(comparison, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    logging.info(
+        "Updated cross-bank comparison for %d currencies", len(comparison["currencies"])
+    )
+    return comparison
+
+
+def load_comparison(path=COMPARISON_PATH):
+    """Persisted comparison, re-read only when the file changes; None if missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is None or cached[0] != version:
+        with open(path, encoding="utf-8") as f:
+            cached = _cache[path] = (version, json.load(f))
+    return cached[1]
@@ -0,0 +1,340 @@
+"""In-memory quote table for the bots and the API, without pandas.
+
+Every CSV column is held in a compact ``array`` (seconds, date ordinals,
+float rates, small label codes) and each (source, currency) series keeps an
+index of its rows in time order plus the position of its latest successful
+quote, so the common questions ("last BNA quote", "every bank on a date")
+never scan the whole history. ``QuoteTable.frame()`` builds a pandas
+DataFrame, importing pandas on first use, for analytical work.
+"""
+
+import csv
+import logging
+import os
+from array import array
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from arbolito.lazy import lazy_import
+from arbolito.quote import DEFAULT_CURRENCY, FIELDNAMES, parse_date, parse_number
+from arbolito.store import QUOTES_PATH
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_NAN = float("nan")
+
+_cache = {}
+
+
+class Row(namedtuple("Row", FIELDNAMES)):
+    """One row of the table; rates are floats and missing values None"""
+
+    __slots__ = ()
+
+
+def data_version(path=QUOTES_PATH):
+    """Identity of the current quotes file contents, or None if missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=8192)
+def _day_seconds(day):
+    return (date.fromisoformat(day).toordinal() - _EPOCH_ORDINAL) * 86400
+
+
+def _seconds(text):
+    """Naive "YYYY-MM-DD HH:MM:SS" as seconds since 1970-01-01 00:00"""
+    return (
+        _day_seconds(text[:10])
+        + int(text[11:13]) * 3600
+        + int(text[14:16]) * 60
+        + int(text[17:19])
+    )
+
+
+@lru_cache(maxsize=8192)
+def _ordinal(text):
+    if not text:
+        return 0
+    try:
+        return date.fromisoformat(text).toordinal()
+    except ValueError:
+        return parse_date(text).toordinal()
+
+
+def _float(text):
+    if not text:
+        return _NAN
+    try:
+        return float(text)
+    except ValueError:
+        # Rows written before the migration keep the Argentine format
+        return float(parse_number(text))
+
+
+class QuoteTable:
+    """Columnar quote history with per-series indexes"""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.times = array("q")
+        self.exchange_dates = array("l")
+        self.buy_rates = array("d")
+        self.sell_rates = array("d")
+        self.sources = array("H")
+        self.currencies = array("H")
+        self.statuses = array("H")
+        self.labels = []
+        self._codes = {}
+        self._series = {}
+        self._latest = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def _code(self, label):
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def _success(self):
+        return self._codes.get("Success")
+
+    def _add(self, row):
+        """Append one CSV row dict; returns its series key and position.
+
+        Raises ValueError or KeyError, before touching any column, when the
+        row does not parse.
+        """
+        key = (row["source"], row.get("currency") or DEFAULT_CURRENCY)
+        values = (
+            _seconds(row["collection_time"]),
+            _ordinal(row["exchange_date"]),
+            _float(row["buy_rate"]),
+            _float(row["sell_rate"]),
+        )
+        position = len(self.times)
+        self.times.append(values[0])
+        self.exchange_dates.append(values[1])
+        self.buy_rates.append(values[2])
+        self.sell_rates.append(values[3])
+        self.sources.append(self._code(key[0]))
+        self.currencies.append(self._code(key[1]))
+        self.statuses.append(self._code(row["status"]))
+        return key, position
+
+    def _index(self, key, position):
+        positions = self._series.get(key)
+        if positions is None:
+            positions = self._series[key] = array("L")
+        positions.append(position)
+        if self.statuses[position] == self._success():
+            self._latest[key] = position
+
+    @classmethod
+    def read_csv(cls, path, version=None):
+        """Build the table from the CSV, one row in memory at a time.
+
+        Rows that do not parse (torn lines, bad dates or rates) are skipped
+        and counted in a warning.
+        """
+        table = cls(version)
+        skipped = 0
+        times, exchange_dates = table.times, table.exchange_dates
+        buy_rates, sell_rates = table.buy_rates, table.sell_rates
+        sources, currencies, statuses = table.sources, table.currencies, table.statuses
+        codes, code = table._codes, table._code
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, None) or FIELDNAMES
+            columns = [header.index(name) if name in header else None for name in FIELDNAMES]
+            collected, exchanged, buy, sell, source, currency, status = columns
+            for row in reader:
+                try:
+                    seconds = _seconds(row[collected])
+                    ordinal = _ordinal(row[exchanged])
+                    buy_rate = _float(row[buy])
+                    sell_rate = _float(row[sell])
+                    labels = (
+                        row[source],
+                        (row[currency] if currency is not None else "") or DEFAULT_CURRENCY,
+                        row[status],
+                    )
+                except (ValueError, IndexError):
+                    skipped += 1
+                    continue
+                times.append(seconds)
+                exchange_dates.append(ordinal)
+                buy_rates.append(buy_rate)
+                sell_rates.append(sell_rate)
+                label = labels[0]
+                sources.append(codes[label] if label in codes else code(label))
+                label = labels[1]
+                currencies.append(codes[label] if label in codes else code(label))
+                label = labels[2]
+                statuses.append(codes[label] if label in codes else code(label))
+        if skipped:
+            logging.warning("Skipped %d malformed rows of %s", skipped, path)
+        table._build_indexes()
+        return table
+
+    def _build_indexes(self):
+        # Series are indexed in time order even when a backfill appended
+        # older rows at the end of the file
+        times, sources, currencies = self.times, self.sources, self.currencies
+        order = range(len(times))
+        if any(times[position] > times[position + 1] for position in order[:-1]):
+            order = sorted(order, key=times.__getitem__)
+        series = {}
+        for position in order:
+            combined = sources[position] << 16 | currencies[position]
+            positions = series.get(combined)
+            if positions is None:
+                positions = series[combined] = array("L")
+            positions.append(position)
+
+        success = self._success()
+        for combined, positions in series.items():
+            key = (self.labels[combined >> 16], self.labels[combined & 0xFFFF])
+            self._series[key] = positions
+            for position in reversed(positions):
+                if self.statuses[position] == success:
+                    self._latest[key] = position
+                    break
+
+    def append_rows(self, rows):
+        """Add rows newer than the last one of their series; returns how many"""
+        added = 0
+        for row in rows:
+            try:
+                key = (row["source"], row.get("currency") or DEFAULT_CURRENCY)
+                positions = self._series.get(key)
+                if positions and _seconds(row["collection_time"]) <= self.times[positions[-1]]:
+                    continue
+                self._index(*self._add(row))
+            except (KeyError, ValueError) as e:
+                logging.warning("Skipped malformed row %r: %s", row, e)
+                continue
+            added += 1
+        return added
+
+    def row(self, position):
+        buy = self.buy_rates[position]
+        sell = self.sell_rates[position]
+        exchange_date = self.exchange_dates[position]
+        return Row(
+            collection_time=_EPOCH + timedelta(seconds=self.times[position]),
+            exchange_date=date.fromordinal(exchange_date) if exchange_date else None,
+            buy_rate=None if buy != buy else buy,
+            sell_rate=None if sell != sell else sell,
+            source=self.labels[self.sources[position]],
+            currency=self.labels[self.currencies[position]],
+            status=self.labels[self.statuses[position]],
+        )
+
+    def series(self, currency=None, bank=None):
+        """(source, currency) keys, optionally of one currency and matching ``bank``.
+
+        ``bank`` is matched like the bots do: contained in the upper-cased
+        source name ("CIUDAD" matches "Banco Ciudad").
+        """
+        return [
+            key
+            for key in self._series
+            if (currency is None or key[1] == currency)
+            and (not bank or bank.upper() in key[0].upper())
+        ]
+
+    def latest(self, currency=None, bank=None, exchange_date=None):
+        """Latest successful row of every matching series.
+
+        With ``exchange_date`` the latest one published for that date.
+        """
+        rows = []
+        for key in self.series(currency, bank):
+            if exchange_date is None:
+                position = self._latest.get(key)
+            else:
+                position = self._latest_on(key, exchange_date.toordinal())
+            if position is not None:
+                rows.append(self.row(position))
+        return rows
+
+    def _latest_on(self, key, ordinal):
+        success = self._success()
+        for position in reversed(self._series[key]):
+            if self.exchange_dates[position] == ordinal and self.statuses[position] == success:
+                return position
+        return None
+
+    def history(self, key, successful=True):
+        """Rows of one series in time order"""
+        success = self._success()
+        return [
+            self.row(position)
+            for position in self._series.get(key, ())
+            if not successful or self.statuses[position] == success
+        ]
+
+    def frame(self):
+        """The table as a pandas DataFrame, sorted by collection time.
+
+        ``collection_time`` is a datetime64 column and ``exchange_date``
+        holds ``datetime.date`` values, like the frames read before.
+        """
+        pd = lazy_import("pandas")
+        rows = [self.row(position) for position in range(len(self))]
+        df = pd.DataFrame(rows, columns=FIELDNAMES)
+        df["collection_time"] = pd.to_datetime(df["collection_time"])
+        return df.sort_values("collection_time", kind="stable").reset_index(drop=True)
+
+
+def load_quotes(path=QUOTES_PATH):
+    """Quote table of ``path``, re-read only when the file changes.
+
+    The table is shared between callers; the change stream appends to it
+    through ``apply_rows``. Returns None when the file does not exist.
+    """
+    version = data_version(path)
+    if version is None:
+        return None
+    cached = _cache.get(path)
+    if cached is not None and cached.version == version:
+        return cached
+
+    table = QuoteTable.read_csv(path, version)
+    _cache[path] = table
+    return table
+
+
+def apply_rows(rows, path=QUOTES_PATH):
+    """Fold rows published on the change stream into the cached table.
+
+    Rows already in the table (the file was re-read after they were
+    written) are skipped. Nothing happens while nothing is cached; the next
+    ``load_quotes`` reads the file anyway. Returns the number of rows added.
+    """
+    table = _cache.get(path)
+    if table is None or not rows:
+        return 0
+    added = table.append_rows(rows)
+    # The table now matches the file as written by the collector
+    table.version = data_version(path) or table.version
+    return added
+
+
+def cached_quotes(path=QUOTES_PATH):
+    """The cached quote table as it is, without checking the file; None if none"""
+    return _cache.get(path)
+
+
+def invalidate(path=QUOTES_PATH):
+    """Drop the cached table so the next ``load_quotes`` re-reads the file"""
+    _cache.pop(path, None)
@@ -0,0 +1,265 @@
+"""Columnar export of the quote history for analysts.
+
+Usage::
+
+    python -m arbolito.export            # bring the export up to date
+    python -m arbolito.export --rebuild  # rewrite it from scratch
+
+The history is kept as date-partitioned Parquet
+(``data/columnar/parquet/date=YYYY-MM-DD/quotes.parquet``) and one Arrow IPC
+file per day (``data/columnar/arrow/YYYY-MM-DD.arrow``) with typed columns:
+timestamp, dictionary-encoded source and currency, float64 rates.
+
+Updates are incremental: the byte offset of the quotes CSV already exported
+is checkpointed, only the new lines are parsed, and only the day partitions
+they touch are rewritten. The checkpoint also records the identity of the
+CSV (inode, size and a hash of its first block), so a file replaced by a
+migration is exported again from scratch instead of from a stale offset.
+Rows already in a partition are not added twice. pyarrow is needed only by
+this module.
+
+Analysts read the export with ``read_quotes`` (source and date filters
+pushed down to Parquet) or ``map_day`` (one day memory-mapped from Arrow).
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+from datetime import datetime
+
+from arbolito.lazy import lazy_import
+from arbolito.logs import setup_logging
+from arbolito.quote import DEFAULT_CURRENCY, TIMESTAMP_FORMAT, parse_date, parse_stored_number
+from arbolito.store import QUOTES_PATH
+
+EXPORT_DIR = os.path.join("data", "columnar")
+# Checkpoint of the export, inside the export directory
+STATE_NAME = "state.json"
+# Leading bytes of the CSV hashed to recognise a replaced file
+IDENTITY_BLOCK = 64 * 1024
+# Columns that identify a row within a day partition
+ROW_KEY = ("collection_time", "source", "currency")
+
+
+def _schema(pa):
+    return pa.schema(
+        [
+            ("collection_time", pa.timestamp("s")),
+            ("exchange_date", pa.date32()),
+            ("source", pa.dictionary(pa.int8(), pa.string())),
+            ("currency", pa.dictionary(pa.int8(), pa.string())),
+            ("buy_rate", pa.float64()),
+            ("sell_rate", pa.float64()),
+        ]
+    )
+
+
+def _parquet_path(export_dir, day):
+    return os.path.join(export_dir, "parquet", f"date={day}", "quotes.parquet")
+
+
+def _arrow_path(export_dir, day):
+    return os.path.join(export_dir, "arrow", f"{day}.arrow")
+
+
+def _head_hash(path, length):
+    """Hash of the first ``length`` bytes of ``path`` (at most one block)"""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(min(length, IDENTITY_BLOCK))).hexdigest()
+
+
+def _replaced(path, state, header):
+    """True when ``path`` is no longer the file the checkpoint was taken on"""
+    if not state["offset"]:
+        return False
+    st = os.stat(path)
+    return (
+        st.st_size < state["offset"]
+        or state.get("header") != header
+        or state.get("inode") != st.st_ino
+        or state.get("head") != _head_hash(path, state["offset"])
+    )
+
+
+def _read_new_rows(path, offset):
+    """Rows appended to the CSV after byte ``offset``, and the new offset"""
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        chunk = f.read()
+    # Leave a partially written last line for the next export
+    end = chunk.rfind(b"\n") + 1
+    fieldnames = next(csv.reader([header.decode("utf-8")]))
+    reader = csv.DictReader(io.StringIO(chunk[:end].decode("utf-8")), fieldnames=fieldnames)
+    return list(reader), max(offset, len(header)) + end
+
+
+def _rows_by_day(rows):
+    days = {}
+    for row in rows:
+        if row.get("status") != "Success":
+            continue
+        try:
+            collected = datetime.strptime(row["collection_time"], TIMESTAMP_FORMAT)
+            exchange_date = parse_date(row["exchange_date"]) if row.get("exchange_date") else None
+            buy = float(parse_stored_number(row["buy_rate"])) if row.get("buy_rate") else None
+            sell = float(parse_stored_number(row["sell_rate"])) if row.get("sell_rate") else None
+        except ValueError:
+            continue
+        days.setdefault(collected.date().isoformat(), []).append(
+            {
+                "collection_time": collected,
+                "exchange_date": exchange_date,
+                "source": row["source"],
+                "currency": row.get("currency") or DEFAULT_CURRENCY,
+                "buy_rate": buy,
+                "sell_rate": sell,
+            }
+        )
+    return days
+
+
+def _write_day(pa, pq, export_dir, day, rows):
+    """Merge ``rows`` into the partition of ``day`` and rewrite its files.
+
+    Rows whose (collection_time, source, currency) is already in the
+    partition are skipped, so re-exporting a range after a crash is
+    harmless. Returns the number of rows added.
+    """
+    schema = _schema(pa)
+    parquet_path = _parquet_path(export_dir, day)
+    existing = pq.read_table(parquet_path, schema=schema) if os.path.exists(parquet_path) else None
+    seen = set()
+    if existing is not None:
+        seen.update(zip(*(existing.column(name).to_pylist() for name in ROW_KEY)))
+    new_rows = []
+    for row in rows:
+        key = tuple(row[name] for name in ROW_KEY)
+        if key not in seen:
+            seen.add(key)
+            new_rows.append(row)
+    if not new_rows:
+        return 0
+
+    new_table = pa.Table.from_pylist(new_rows, schema=schema)
+    if existing is not None:
+        table = pa.concat_tables([existing, new_table]).unify_dictionaries()
+    else:
+        table = new_table
+    table = table.sort_by("collection_time")
+
+    for path in (parquet_path, _arrow_path(export_dir, day)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = parquet_path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, parquet_path)
+
+    arrow_path = _arrow_path(export_dir, day)
+    tmp_path = arrow_path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table.combine_chunks())
+    os.replace(tmp_path, arrow_path)
+    return len(new_rows)
+
+
+def update_export(path=QUOTES_PATH, export_dir=EXPORT_DIR, rebuild=False):
+    """Export the quotes appended since the last run; returns rows exported"""
+    pa = lazy_import("pyarrow")
+    lazy_import("pyarrow.ipc")
+    pq = lazy_import("pyarrow.parquet")
+
+    state_path = os.path.join(export_dir, STATE_NAME)
+    state = None
+    if not rebuild:
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+    # Without a checkpoint the partitions on disk cannot be trusted
+    if state is None:
+        state = {"offset": 0, "size": 0}
+        if os.path.isdir(export_dir):
+            lazy_import("shutil").rmtree(export_dir)
+
+    if not os.path.isfile(path):
+        return 0
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8")
+    # A replaced or rewritten file cannot be resumed at the old offset
+    if _replaced(path, state, header):
+        logging.info("Quotes file was replaced, rebuilding the columnar export")
+        return update_export(path, export_dir, rebuild=True)
+
+    rows, offset = _read_new_rows(path, state["offset"])
+    exported = 0
+    for day, day_rows in sorted(_rows_by_day(rows).items()):
+        exported += _write_day(pa, pq, export_dir, day, day_rows)
+
+    os.makedirs(export_dir, exist_ok=True)
+    state = {
+        "offset": offset,
+        "size": os.path.getsize(path),
+        "inode": os.stat(path).st_ino,
+        "head": _head_hash(path, offset),
+        "header": header,
+    }
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+    if exported:
+        logging.info("Exported %d quotes to %s", exported, export_dir)
+    return exported
+
+
+def read_quotes(sources=None, start=None, end=None, export_dir=EXPORT_DIR):
+    """Load quotes from the Parquet dataset, filtering by source and date.
+
+    ``start``/``end`` are ``datetime.date`` values (inclusive). Only the
+    matching day partitions are opened and the source filter is pushed down
+    to the Parquet reader. Returns a ``pyarrow.Table``.
+    """
+    ds = lazy_import("pyarrow.dataset")
+    pa = lazy_import("pyarrow")
+    dataset = ds.dataset(
+        os.path.join(export_dir, "parquet"),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("date", pa.date32())]), flavor="hive"),
+    )
+    condition = None
+    for expression in (
+        ds.field("date") >= pa.scalar(start, pa.date32()) if start else None,
+        ds.field("date") <= pa.scalar(end, pa.date32()) if end else None,
+        ds.field("source").isin(list(sources)) if sources else None,
+    ):
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+    return dataset.to_table(filter=condition)
+
+
+def map_day(day, export_dir=EXPORT_DIR):
+    """Memory-map the Arrow IPC file of one day (zero-copy) as a Table"""
+    pa = lazy_import("pyarrow")
+    lazy_import("pyarrow.ipc")
+    source = pa.memory_map(_arrow_path(export_dir, day.isoformat()), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar export of the quote history")
+    parser.add_argument("--path", default=QUOTES_PATH)
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="rewrite the export from scratch")
+    args = parser.parse_args(argv)
+
+    setup_logging("log/export_log.log")
+    update_export(args.path, args.export_dir, args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
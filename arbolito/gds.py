@@ -0,0 +1,210 @@
+"""Parser for GDS itinerary segment lines (Amadeus-style PNR dumps).
+
+Usage::
+
+    python -m arbolito.gds API_Telegram/Codigo_Vuelo.txt     # JSON lines
+    python -m arbolito.gds --bench API_Telegram/Codigo_Vuelo.txt
+
+A segment line looks like::
+
+    7  CM2517 Q 02MAY 4*SANSFO DK1  1344 1533  02MAY  E  0 E7W S
+    4  EK 248 B 19MAY 7*EZEDXB HK3  2230 0030  21MAY  E  EK/DKS3ZJ
+
+segment number, airline and flight, booking class, departure date and day
+of week, city pair, status code with party size, departure and arrival
+times, arrival date, then either stops/equipment/meal or the airline record
+locator. Leading whitespace and spacing vary between dumps.
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from collections import namedtuple
+from datetime import date
+from datetime import time as dt_time
+
+SEGMENT_FIELDS = [
+    "number",
+    "airline",
+    "flight",
+    "booking_class",
+    "departure_date",
+    "origin",
+    "destination",
+    "status",
+    "party_size",
+    "departure_time",
+    "arrival_time",
+    "arrival_date",
+    "stops",
+    "equipment",
+    "meal",
+    "record_locator",
+]
+
+# Common segment status codes
+STATUS_CODES = {
+    "HK": "confirmado",
+    "DK": "confirmado (venta directa)",
+    "KK": "confirmado por la aerolínea",
+    "TK": "confirmado con cambio de horario",
+    "RR": "reconfirmado",
+    "HL": "en lista de espera",
+    "KL": "confirmado desde lista de espera",
+    "UC": "no se pudo confirmar",
+    "UN": "vuelo no operado",
+    "HX": "cancelado",
+    "NO": "sin acción",
+}
+
+_MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], 1
+    )
+}
+
+_SEGMENT_RE = re.compile(
+    r"""
+    ^\s*(?P<number>\d{1,2})\s+
+    (?P<airline>[A-Z0-9]{2})\s*(?P<flight>\d{1,4})\s+
+    (?P<booking_class>[A-Z])\s+
+    (?P<departure_date>\d{2}[A-Z]{3})\s+
+    (?P<weekday>[1-7])[*\s]
+    (?P<origin>[A-Z]{3})(?P<destination>[A-Z]{3})\s+
+    (?P<status>[A-Z]{2})(?P<party_size>\d{1,2})\s+
+    (?P<departure_time>\d{4})\s+(?P<arrival_time>\d{4})
+    (?:\s+(?P<arrival_date>\d{2}[A-Z]{3}))?
+    (?:\s+E)?
+    (?:
+        \s+(?P<locator_airline>[A-Z0-9]{2})/(?P<record_locator>[A-Z0-9]{1,8})
+      | \s+(?P<stops>\d)\s+(?P<equipment>[A-Z0-9]{3})(?:\s+(?P<meal>[A-Z]{1,4}))?
+    )?
+    \s*$
+    """,
+    re.VERBOSE,
+)
+
+
+class Segment(namedtuple("Segment", SEGMENT_FIELDS)):
+    """One flight segment, with dates, times and counts already typed"""
+
+    __slots__ = ()
+
+    @property
+    def status_text(self):
+        return STATUS_CODES.get(self.status, self.status)
+
+    def to_dict(self):
+        record = self._asdict()
+        for name in ("departure_date", "arrival_date"):
+            if record[name] is not None:
+                record[name] = record[name].isoformat()
+        for name in ("departure_time", "arrival_time"):
+            record[name] = record[name].isoformat(timespec="minutes")
+        return record
+
+
+def _date(text, year):
+    return date(year, _MONTHS[text[2:]], int(text[:2]))
+
+
+def _time(text):
+    return dt_time(int(text[:2]), int(text[2:]))
+
+
+def parse_segment(line, year=None):
+    """Parse one segment line; returns None for lines that are not segments.
+
+    Dumps carry no year: ``year`` (default: the current one) is used for
+    the departure, and an arrival month earlier than the departure month
+    rolls over to the next year.
+    """
+    match = _SEGMENT_RE.match(line)
+    if match is None:
+        return None
+    fields = match.groupdict()
+    year = year or date.today().year
+    try:
+        departure = _date(fields["departure_date"], year)
+        arrival = None
+        if fields["arrival_date"]:
+            arrival = _date(fields["arrival_date"], year)
+            if arrival < departure:
+                arrival = arrival.replace(year=year + 1)
+        departure_time = _time(fields["departure_time"])
+        arrival_time = _time(fields["arrival_time"])
+    except (KeyError, ValueError):
+        return None
+    return Segment(
+        number=int(fields["number"]),
+        airline=fields["airline"],
+        flight=fields["flight"],
+        booking_class=fields["booking_class"],
+        departure_date=departure,
+        origin=fields["origin"],
+        destination=fields["destination"],
+        status=fields["status"],
+        party_size=int(fields["party_size"]),
+        departure_time=departure_time,
+        arrival_time=arrival_time,
+        arrival_date=arrival,
+        stops=int(fields["stops"]) if fields["stops"] else None,
+        equipment=fields["equipment"],
+        meal=fields["meal"],
+        record_locator=(
+            f"{fields['locator_airline']}/{fields['record_locator']}"
+            if fields["record_locator"]
+            else None
+        ),
+    )
+
+
+def iter_segments(lines, year=None):
+    """Yield the segments of an iterable of lines, skipping everything else"""
+    year = year or date.today().year
+    for line in lines:
+        segment = parse_segment(line, year)
+        if segment is not None:
+            yield segment
+
+
+def parse_file(path, year=None):
+    """Stream the segments of a dump file, one line in memory at a time"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from iter_segments(f, year)
+
+
+def benchmark(path, repeat=2000):
+    """Parse the lines of ``path`` ``repeat`` times; returns segments per second"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        lines = f.readlines()
+    start = time.perf_counter()
+    count = 0
+    for _ in range(repeat):
+        for _ in iter_segments(lines):
+            count += 1
+    elapsed = time.perf_counter() - start
+    return count, elapsed, count / elapsed if elapsed else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse GDS itinerary segment lines")
+    parser.add_argument("path", nargs="?", default="API_Telegram/Codigo_Vuelo.txt")
+    parser.add_argument("--year", type=int, help="year of the dump (default: current)")
+    parser.add_argument("--bench", action="store_true", help="report segments parsed per second")
+    parser.add_argument("--repeat", type=int, default=2000, help="passes over the file in --bench")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        count, elapsed, rate = benchmark(args.path, args.repeat)
+        print(f"{count} segments in {elapsed:.2f} s: {rate:,.0f} segments/s")
+        return
+    for segment in parse_file(args.path, args.year):
+        sys.stdout.write(json.dumps(segment.to_dict()) + "\n")
+
+
+if __name__ == "__main__":
+    main()
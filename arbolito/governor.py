@@ -0,0 +1,239 @@
+"""Host-wide cap on concurrent browser sessions and their memory.
+
+Headless browsers are the expensive part of a collection, and several
+scheduled runs can overlap on one small VM. ``BrowserGovernor.session``
+holds one of N browser slots for the duration of a Selenium or Playwright
+fetch; the slots are ``flock``ed files under ``data/browser_slots``, so the
+cap holds across every collector process on the host, not only within one
+run. N is sized from available memory and CPUs. HTTP-only strategies never
+take a slot.
+
+While ``watch()`` is active a thread samples the RSS of the process tree,
+records the peak and kills child trees (driver plus browser) that grow
+past a ceiling. ``record_run`` appends the figures of each run to
+``data/run_stats.jsonl`` for sizing hosts.
+"""
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+RUN_STATS_PATH = os.path.join("data", "run_stats.jsonl")
+SLOTS_DIR = os.path.join("data", "browser_slots")
+# How often a queued browser fetch checks for a free slot
+SLOT_POLL_SECONDS = 0.5
+
+# Rough resident size of one headless Chrome session with its driver
+BROWSER_MEMORY_MB = 350
+# Memory left for everything else on the host
+RESERVED_MEMORY_MB = 256
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024) if hasattr(os, "sysconf") else 0.004
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, or None where it cannot be read"""
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def browser_slots(per_browser_mb=BROWSER_MEMORY_MB, reserved_mb=RESERVED_MEMORY_MB):
+    """How many browser sessions this host can run at once (at least one)"""
+    cpus = os.cpu_count() or 1
+    memory = available_memory_mb()
+    if memory is None:
+        return 1
+    return max(1, min(cpus, int((memory - reserved_mb) // per_browser_mb)))
+
+
+def _process_table():
+    """Map pid -> (ppid, rss_mb) for every process visible in /proc"""
+    table = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", encoding="ascii", errors="replace") as f:
+                stat = f.read()
+            with open(f"/proc/{name}/statm", encoding="ascii") as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        # The command name is in parentheses and may contain spaces
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        table[int(name)] = (ppid, rss_pages * _PAGE_MB)
+    return table
+
+
+def _try_lock(f):
+    """Take an exclusive lock on the open file ``f`` without waiting"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _subtree(table, root):
+    children = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, ()))
+    return pids
+
+
+class BrowserGovernor:
+    """Caps concurrent browser sessions and watches their memory.
+
+    Browser-based fetches run inside ``session()``, which waits for one of
+    ``slots`` slot files in ``slots_dir`` shared by every process on the
+    host; HTTP-only sources are not affected. While ``watch()`` is active,
+    a background thread samples the RSS of this process tree, records the
+    peak and kills any child process tree (driver plus browser) that grows
+    past ``memory_ceiling_mb``.
+    """
+
+    def __init__(self, slots=None, memory_ceiling_mb=1024, poll_interval=1.0, slots_dir=SLOTS_DIR):
+        self.slots = slots or browser_slots()
+        self.memory_ceiling_mb = memory_ceiling_mb
+        self.poll_interval = poll_interval
+        self.slots_dir = slots_dir
+        self.peak_tree_rss_mb = 0.0
+        self.killed = []
+        self._stop = threading.Event()
+
+    def _acquire(self, source, deadline):
+        """Open and lock a free slot file, waiting until ``deadline``"""
+        os.makedirs(self.slots_dir, exist_ok=True)
+        waiting = False
+        while True:
+            for index in range(self.slots):
+                f = open(os.path.join(self.slots_dir, f"slot-{index}.lock"), "a+b")
+                if _try_lock(f):
+                    return f
+                f.close()
+            if not waiting:
+                logging.info(
+                    "%s waiting for a browser slot (%d in use on this host)",
+                    source,
+                    self.slots,
+                    extra={"source": source, "phase": "governor"},
+                )
+                waiting = True
+            delay = SLOT_POLL_SECONDS
+            if deadline is not None:
+                if deadline.expired:
+                    raise TimeoutError(f"No browser slot for {source} before the deadline")
+                delay = min(delay, deadline.remaining())
+            time.sleep(delay)
+
+    @contextmanager
+    def session(self, source, deadline=None):
+        """Hold a host-wide browser slot for the duration of the block"""
+        slot = self._acquire(source, deadline)
+        try:
+            yield
+        finally:
+            _unlock(slot)
+            slot.close()
+
+    @contextmanager
+    def watch(self):
+        """Run the memory watchdog for the duration of the block"""
+        if not os.path.isdir("/proc"):
+            yield self
+            return
+        self._stop.clear()
+        thread = threading.Thread(target=self._watchdog, name="browser-watchdog", daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            thread.join()
+
+    def _watchdog(self):
+        me = os.getpid()
+        while not self._stop.wait(self.poll_interval):
+            table = _process_table()
+            tree_rss = sum(table[pid][1] for pid in _subtree(table, me) if pid in table)
+            self.peak_tree_rss_mb = max(self.peak_tree_rss_mb, tree_rss)
+
+            for child in (pid for pid, (ppid, _) in table.items() if ppid == me):
+                pids = _subtree(table, child)
+                rss = sum(table[pid][1] for pid in pids if pid in table)
+                if rss > self.memory_ceiling_mb:
+                    self._kill(pids, rss)
+
+    def _kill(self, pids, rss):
+        logging.error(
+            "Killing runaway browser process tree %s using %.0f MB (ceiling %d MB)",
+            pids,
+            rss,
+            self.memory_ceiling_mb,
+            extra={"phase": "governor"},
+        )
+        for pid in reversed(pids):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.killed.append({"pids": pids, "rss_mb": round(rss, 1)})
+
+    def stats(self):
+        """Peak memory figures for the run, in MB"""
+        self_kb = children_kb = 0
+        if resource is not None:
+            self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return {
+            "browser_slots": self.slots,
+            "peak_rss_mb": round(self_kb / 1024, 1),
+            "peak_child_rss_mb": round(children_kb / 1024, 1),
+            "peak_tree_rss_mb": round(self.peak_tree_rss_mb, 1),
+            "killed": self.killed,
+        }
+
+
+def record_run(stats, path=RUN_STATS_PATH):
+    """Append one run's statistics as a JSON line"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(stats, sort_keys=True) + "\n")
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from arbolito.quote import TIMESTAMP_FORMAT, Quote
+
+HEALTH_PATH = os.path.join("data", "source_health.json")
+
+# A source whose last success is older than this is reported as stale
+STALE_AFTER = 2 * 3600
+
+_cache = {}
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Substrings of a failure status mapped to a coarse error class
+_ERROR_CLASSES = (
+    ("captcha", "captcha"),
+    ("timed out", "timeout"),
+    ("timeout", "timeout"),
+    ("connection", "network"),
+    ("name resolution", "network"),
+    ("could not find", "markup"),
+    ("no currency", "markup"),
+    ("unable to locate element", "markup"),
+    ("decode json", "bad_response"),
+    ("webdriver", "browser"),
+    ("chrome", "browser"),
+)
+
+
+def classify_error(status):
+    """Coarse class of a failure status ("captcha", "markup", "network"...)"""
+    text = (status or "").lower()
+    for needle, error_class in _ERROR_CLASSES:
+        if needle in text:
+            return error_class
+    return "error"
+
+
+class Deadline:
+    """Wall-clock budget shared by every source of one collection run"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def backoff_delay(attempt, base=2.0, cap=30.0, deadline=None):
+    """Full-jitter exponential backoff for ``attempt`` (0-based).
+
+    The delay never runs past ``deadline``; callers should stop retrying
+    when it returns 0 because the budget is spent.
+    """
+    delay = random.uniform(0, min(cap, base * 2**attempt))
+    if deadline is not None:
+        delay = min(delay, deadline.remaining())
+    return delay
+
+
+class SourceHealth:
+    """Per-source failure tracking and circuit breaker, persisted as JSON.
+
+    After ``failure_threshold`` consecutive failures a source is skipped
+    until its cool-down ends; the cool-down doubles with each further
+    failure (up to 16x) and carries some jitter so sources do not all
+    re-probe on the same run. Once it ends, a single half-open attempt
+    decides whether the circuit closes again.
+    """
+
+    def __init__(self, path=HEALTH_PATH, failure_threshold=3, cooldown=1800):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.sources = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.sources = {}
+
+    def record(self, source):
+        return self.sources.setdefault(
+            source,
+            {
+                "consecutive_failures": 0,
+                "last_error": None,
+                "last_error_class": None,
+                "last_failure": None,
+                "last_success": None,
+                "open_until": None,
+                "last_latency_ms": None,
+                "backend": None,
+            },
+        )
+
+    def state(self, source, now=None):
+        """Return CLOSED, OPEN or HALF_OPEN for ``source``"""
+        entry = self.record(source)
+        if entry["consecutive_failures"] < self.failure_threshold:
+            return CLOSED
+        now = now or datetime.now()
+        if entry["open_until"] and now.strftime(TIMESTAMP_FORMAT) < entry["open_until"]:
+            return OPEN
+        return HALF_OPEN
+
+    def record_success(self, source, now=None):
+        entry = self.record(source)
+        entry["consecutive_failures"] = 0
+        entry["open_until"] = None
+        entry["last_success"] = (now or datetime.now()).strftime(TIMESTAMP_FORMAT)
+
+    def record_failure(self, source, status, now=None):
+        now = now or datetime.now()
+        entry = self.record(source)
+        entry["consecutive_failures"] += 1
+        entry["last_error"] = status
+        entry["last_error_class"] = classify_error(status)
+        entry["last_failure"] = now.strftime(TIMESTAMP_FORMAT)
+        excess = entry["consecutive_failures"] - self.failure_threshold
+        if excess >= 0:
+            seconds = self.cooldown * 2 ** min(excess, 4) * random.uniform(0.8, 1.2)
+            entry["open_until"] = (now + timedelta(seconds=seconds)).strftime(
+                TIMESTAMP_FORMAT
+            )
+
+    def record_latency(self, source, seconds, backend=None):
+        entry = self.record(source)
+        entry["last_latency_ms"] = round(seconds * 1000)
+        entry["backend"] = backend
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.sources, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def is_stale(entry, now=None, max_age=STALE_AFTER):
+    """True when a health entry has no success within ``max_age`` seconds"""
+    if not entry or not entry.get("last_success"):
+        return True
+    last = datetime.strptime(entry["last_success"], TIMESTAMP_FORMAT)
+    return ((now or datetime.now()) - last).total_seconds() > max_age
+
+
+def load_health(path=HEALTH_PATH):
+    """Per-source health for read-only use, re-read only when the file changes.
+
+    Returns ``{}`` when the collector has not saved it yet.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return {}
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is None or cached[0] != version:
+        try:
+            with open(path, encoding="utf-8") as f:
+                sources = json.load(f)
+        except json.JSONDecodeError:
+            return cached[1] if cached else {}
+        cached = _cache[path] = (version, sources)
+    return cached[1]
+
+
+def run_guarded(health, source, fetch, deadline, backend=None):
+    """Run ``fetch(probe)`` for ``source`` unless its circuit is open.
+
+    ``probe`` is True for the single half-open attempt, so the fetch can
+    skip its retries. The fetch latency and ``backend`` are kept in the
+    health record; ``backend`` may be a callable, asked after the fetch
+    which backend it ended up using. Returns the fetched quotes, or one
+    failure quote when the source was skipped.
+    """
+    state = health.state(source)
+    if state == OPEN:
+        logging.warning(
+            "Skipping %s: circuit open until %s (%s)",
+            source,
+            health.record(source)["open_until"],
+            health.record(source)["last_error_class"],
+            extra={"source": source, "phase": "breaker"},
+        )
+        return [Quote.failure(source, "Skipped: circuit open")]
+    if deadline.expired:
+        logging.warning(
+            "Skipping %s: run deadline reached",
+            source,
+            extra={"source": source, "phase": "breaker"},
+        )
+        return [Quote.failure(source, "Skipped: run deadline reached")]
+
+    if state == HALF_OPEN:
+        logging.info(
+            "Probing %s after cool-down", source, extra={"source": source, "phase": "breaker"}
+        )
+    started = time.perf_counter()
+    try:
+        quotes = fetch(state == HALF_OPEN)
+    except Exception as e:
+        logging.error(
+            "Unhandled error collecting %s: %s",
+            source,
+            e,
+            exc_info=True,
+            extra={"source": source, "phase": "fetch"},
+        )
+        quotes = [Quote.failure(source, f"Critical Error: {str(e)}")]
+    if callable(backend):
+        backend = backend()
+    health.record_latency(source, time.perf_counter() - started, backend)
+
+    failures = [quote for quote in quotes if not quote.ok]
+    if len(failures) < len(quotes):
+        health.record_success(source)
+    else:
+        health.record_failure(source, failures[0].status if failures else "Error: no data")
+    return quotes
@@ -0,0 +1,29 @@
+import importlib
+import logging
+import sys
+import time
+
+# Seconds spent importing each module loaded through lazy_import()
+IMPORT_TIMES = {}
+
+
+def lazy_import(name):
+    """Import ``name`` on first use and remember how long it took"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = time.perf_counter() - start
+    return module
+
+
+def report_import_times():
+    """Log the import time of every lazily loaded module, slowest first"""
+    for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1]):
+        logging.info(
+            "Imported %s in %.1f ms",
+            name,
+            seconds * 1000,
+            extra={"phase": "import", "duration_ms": round(seconds * 1000, 1)},
+        )
@@ -0,0 +1,212 @@
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+CONSOLE_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Structured fields that callers can attach through ``extra=``
+STRUCTURED_FIELDS = ("source", "phase", "duration_ms")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render each record as one JSON object per line"""
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotate when the file grows past ``max_bytes`` or the day changes.
+
+    Rotated files are gzip-compressed (``name.log.1.gz``, ``name.log.2.gz``...).
+    """
+
+    def __init__(self, filename, max_bytes=5 * 1024 * 1024, backup_count=14):
+        super().__init__(
+            filename,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+        self.namer = _gzip_namer
+        self.rotator = _gzip_rotator
+        self._day = _file_day(self.baseFilename)
+
+    def shouldRollover(self, record):
+        if self._day is not None and self._day != date.today():
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._day = date.today()
+
+    def emit(self, record):
+        if self._day is None:
+            self._day = date.today()
+        super().emit(record)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that only merges the message arguments.
+
+    The default implementation formats the whole record on the caller's
+    thread; the real formatting is left to the listener instead.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_day(path):
+    try:
+        return date.fromtimestamp(os.path.getmtime(path))
+    except OSError:
+        return None
+
+
+def setup_logging(
+    log_file="log/exchange_rate_log.log",
+    level=logging.INFO,
+    console_format=CONSOLE_FORMAT,
+    max_bytes=5 * 1024 * 1024,
+    backup_count=14,
+):
+    """Route the root logger through a queue drained by a background listener.
+
+    File output is JSON lines with size/day rotation and gzip compression;
+    the console keeps the human readable format. Pass ``log_file=None`` to
+    log to the console only. Calling it again is a no-op.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handlers = []
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        file_handler = CompressedRotatingFileHandler(log_file, max_bytes, backup_count)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(console_format))
+    handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Flush pending records and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def timed(source, phase, logger=None, level=logging.INFO):
+    """Log how long the wrapped block took, with structured fields"""
+    logger = logger or logging.getLogger()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        if logger.isEnabledFor(level):
+            logger.log(
+                level,
+                "%s %s took %.1f ms",
+                source,
+                phase,
+                duration_ms,
+                extra={"source": source, "phase": phase, "duration_ms": duration_ms},
+            )
+
+
+def measure_overhead(iterations=100_000):
+    """Return the per-call cost in microseconds of common logging calls.
+
+    ``debug_disabled`` is a filtered DEBUG call with a large argument, and
+    ``info_enqueued`` an INFO call handed to the queue (setup_logging() must
+    have been called for it to reflect the real pipeline).
+    """
+    logger = logging.getLogger("arbolito.logs.bench")
+    payload = {"respuesta": [{"moneda": i} for i in range(100)]}
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        logger.debug("Full BBVA response: %s", payload)
+    results["debug_disabled"] = (time.perf_counter() - start) / iterations * 1e6
+
+    # Keep the benchmark records out of the log file and console
+    logger.propagate = False
+    logger.addHandler(_QueueHandler(queue.SimpleQueue()))
+    start = time.perf_counter()
+    for i in range(iterations):
+        logger.info("BBVA rates: Compra=%s, Venta=%s", i, i, extra={"source": "BBVA"})
+    results["info_enqueued"] = (time.perf_counter() - start) / iterations * 1e6
+    return results
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.INFO)
+    for name, micros in measure_overhead().items():
+        print(f"{name}: {micros:.3f} us/call")
@@ -0,0 +1,129 @@
+"""Code lookups compiled from the reference spreadsheets.
+
+Usage::
+
+    python -m arbolito.lookups     # compile the caches and report timings
+
+``API_Telegram/Lista_Destinos.xlsx`` maps airport codes to cities and
+``API_Telegram/Lista_Status.xlsx`` maps ticket coupon status letters to
+their description. Each sheet is read with openpyxl only when it changed
+(by mtime and size); the resulting dict is stored as a marshal file under
+``data/lookup_cache`` and kept in memory, so lookups never parse Excel.
+"""
+
+import logging
+import marshal
+import os
+import time
+
+from arbolito.lazy import lazy_import
+from arbolito.logs import setup_logging
+
+CACHE_DIR = os.path.join("data", "lookup_cache")
+
+# name: (spreadsheet, key column, value column)
+TABLES = {
+    "destinos": (os.path.join("API_Telegram", "Lista_Destinos.xlsx"), "Codigo", "Ciudad"),
+    "coupon_status": (
+        os.path.join("API_Telegram", "Lista_Status.xlsx"),
+        "Coupon status",
+        "Description",
+    ),
+}
+
+_tables = {}
+
+
+def _read_xlsx(path, key_column, value_column):
+    openpyxl = lazy_import("openpyxl")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows)]
+        missing = [column for column in (key_column, value_column) if column not in header]
+        if missing:
+            raise ValueError(f"{path} has no column {', '.join(missing)} in its first row")
+        key_index, value_index = header.index(key_column), header.index(value_column)
+        table = {}
+        for row in rows:
+            key = row[key_index] if key_index < len(row) else None
+            value = row[value_index] if value_index < len(row) else None
+            if key is None:
+                continue
+            table[str(key).strip().upper()] = str(value).strip() if value is not None else ""
+        return table
+    finally:
+        workbook.close()
+
+
+def load_table(name, cache_dir=CACHE_DIR):
+    """Code -> description dict of table ``name``, compiled on first use"""
+    table = _tables.get(name)
+    if table is not None:
+        return table
+
+    path, key_column, value_column = TABLES[name]
+    start = time.perf_counter()
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cache_path = os.path.join(cache_dir, name + ".marshal")
+    try:
+        with open(cache_path, "rb") as f:
+            cached_version, table = marshal.load(f)
+        if tuple(cached_version) != version:
+            table = None
+    except (OSError, EOFError, ValueError, TypeError):
+        table = None
+
+    source = "cache"
+    if table is None:
+        source = "xlsx"
+        table = _read_xlsx(path, key_column, value_column)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            marshal.dump((version, table), f)
+        os.replace(tmp_path, cache_path)
+
+    elapsed = (time.perf_counter() - start) * 1000
+    logging.info(
+        "Loaded %s lookup (%d codes) from %s in %.1f ms",
+        name,
+        len(table),
+        source,
+        elapsed,
+        extra={"phase": "lookup", "duration_ms": round(elapsed, 1)},
+    )
+    _tables[name] = table
+    return table
+
+
+def city_name(code):
+    """City of an airport code ("COR" -> "Cordoba"), or None if unknown"""
+    return load_table("destinos").get(code.upper()) or None
+
+
+def coupon_status(code):
+    """Description of a ticket coupon status letter ("F" -> "Flown/Used (a)")"""
+    return load_table("coupon_status").get(code.upper()) or None
+
+
+def main():
+    setup_logging(log_file=None)
+    for name in TABLES:
+        _tables.pop(name, None)
+        start = time.perf_counter()
+        load_table(name)
+        first = time.perf_counter() - start
+        _tables.pop(name, None)
+        start = time.perf_counter()
+        load_table(name)
+        cached = time.perf_counter() - start
+        print(
+            f"{name}: first load {first * 1000:.1f} ms, "
+            f"cold start from cache {cached * 1000:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Bulk migration of historical exchange rate CSVs into one canonical file.
+
+Usage::
+
+    python -m arbolito.migrate exchange_rates.csv BNA/exchange_rates.csv \\
+        data/exchange_rates_v2.csv --output data/exchange_rates_canonical.csv
+    python -m arbolito.migrate --cutover     # then swap it in for the bots
+
+Inputs are streamed in chunks and normalized with vectorized pandas string
+operations that follow the same rules as ``arbolito.quote.parse_number`` and
+``parse_date``; rows without a currency are taken as USD, and rates are
+written with ``format_rate`` like the store does. The byte offset reached in
+every input is checkpointed after each chunk, so an interrupted run picks up
+where it stopped when launched again.
+
+The output is a separate file. ``--cutover`` finishes the migration by
+replacing the live quotes file with it: under the store lock, rows the
+collector appended since the live file was read are migrated too, then the
+output is renamed over ``data/exchange_rates_v2.csv`` in one step.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import time
+from decimal import Decimal
+
+import pandas as pd
+
+from arbolito.export import EXPORT_DIR, STATE_NAME
+from arbolito.logs import setup_logging
+from arbolito.quote import DEFAULT_CURRENCY, FIELDNAMES, TIMESTAMP_FORMAT, format_rate
+from arbolito.store import QUOTES_PATH, QuoteStore
+
+DEFAULT_INPUTS = [
+    "exchange_rates.csv",
+    os.path.join("BNA", "exchange_rates.csv"),
+    os.path.join("data", "exchange_rates_v2.csv"),
+]
+DEFAULT_OUTPUT = os.path.join("data", "exchange_rates_canonical.csv")
+
+_GROUPED_RE = r"^-?\d{1,3}(?:\.\d{3})+(?:,\d+)?$"
+_DMY_RE = r"^\s*(\d{1,2})/(\d{1,2})/(\d{4})"
+_ISO_RE = r"^\s*(\d{4})-(\d{1,2})-(\d{1,2})"
+
+
+def normalize_numbers(column, canonical=False):
+    """Vectorized Argentine-locale parse of a string column into float64.
+
+    With ``canonical`` (files written by the store) a number without a
+    comma is dot-decimal, as ``parse_stored_number`` reads it: "215.125"
+    stays 215.125 instead of being taken as grouped thousands.
+    """
+    text = column.str.strip().str.replace(r"^\$\s*", "", regex=True)
+    thousands = text.str.contains(",", regex=False)
+    if not canonical:
+        thousands |= text.str.match(_GROUPED_RE)
+    text = text.mask(thousands, text.str.replace(".", "", regex=False))
+    return pd.to_numeric(text.str.replace(",", ".", regex=False), errors="coerce")
+
+
+def canonical_rates(column, canonical=False):
+    """Rates of a string column as text written by ``format_rate``, "" when invalid"""
+    numbers = normalize_numbers(column, canonical)
+    # Shortest float repr, as parse_number reads the floats of JSON endpoints
+    return numbers.map(lambda value: "" if pd.isna(value) else format_rate(Decimal(repr(value))))
+
+
+def normalize_dates(column):
+    """Vectorized parse of dd/mm/yyyy and ISO dates into ISO strings"""
+    dmy = column.str.extract(_DMY_RE)
+    iso = column.str.extract(_ISO_RE)
+    year = iso[0].fillna(dmy[2])
+    month = iso[1].fillna(dmy[1]).str.zfill(2)
+    day = iso[2].fillna(dmy[0]).str.zfill(2)
+    parsed = pd.to_datetime(year + "-" + month + "-" + day, format="%Y-%m-%d", errors="coerce")
+    return parsed.dt.strftime("%Y-%m-%d").fillna("")
+
+
+def normalize_chunk(chunk, canonical=False):
+    """Return the chunk in canonical shape, dropping rows without a timestamp.
+
+    ``canonical`` marks chunks of files already written by the store (they
+    have a ``currency`` column), whose plain numbers are dot-decimal.
+    """
+    chunk = chunk.reindex(columns=FIELDNAMES).fillna("").astype(str)
+    collected = pd.to_datetime(chunk["collection_time"], format=TIMESTAMP_FORMAT, errors="coerce")
+    chunk = chunk[collected.notna()].copy()
+    chunk["collection_time"] = collected[collected.notna()].dt.strftime(TIMESTAMP_FORMAT)
+    chunk["exchange_date"] = normalize_dates(chunk["exchange_date"])
+    chunk["buy_rate"] = canonical_rates(chunk["buy_rate"], canonical)
+    chunk["sell_rate"] = canonical_rates(chunk["sell_rate"], canonical)
+    # Files written before multi-currency collection only held dollar quotes
+    chunk["currency"] = chunk["currency"].mask(chunk["currency"] == "", DEFAULT_CURRENCY)
+    return chunk
+
+
+def _row_keys(frame):
+    return frame["source"] + "|" + frame["currency"] + "|" + frame["collection_time"]
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+
+def _save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _existing_keys(output, chunksize):
+    """Keys already written to the output, so resumed runs stay deduplicated"""
+    seen = set()
+    if not os.path.isfile(output) or os.path.getsize(output) == 0:
+        return seen
+    reader = pd.read_csv(
+        output,
+        usecols=["collection_time", "source", "currency"],
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        seen.update(_row_keys(chunk))
+    return seen
+
+
+def _read_chunks(path, offset, chunksize):
+    """Yield ``(frame, bad lines, end offset)`` for the rows of ``path`` after byte ``offset``.
+
+    Chunks are cut on line boundaries, so the offset after a chunk is an
+    exact resume point. Lines with more fields than the header are
+    skipped. A last line without its newline is only taken when it holds
+    a full row (a writer may still be appending to it). Fields with
+    embedded newlines are not supported; the quote files have none.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        fields = len(next(csv.reader([header.decode("utf-8", "replace")]), []))
+        offset = max(offset, f.tell())
+        f.seek(offset)
+        while True:
+            lines = list(itertools.islice(f, chunksize))
+            if lines and not lines[-1].endswith(b"\n"):
+                tail = lines[-1].decode("utf-8", "replace")
+                if len(next(csv.reader([tail]), [])) != fields:
+                    lines.pop()
+            if not lines:
+                return
+            offset += sum(len(line) for line in lines)
+            rows = csv.reader(line.decode("utf-8", "replace") for line in lines)
+            good = [line for line, row in zip(lines, rows) if len(row) <= fields]
+            frame = pd.read_csv(
+                io.BytesIO(header + b"".join(good)),
+                dtype=str,
+                keep_default_na=False,
+                index_col=False,
+            )
+            yield frame, len(lines) - len(good), offset
+
+
+def migrate(inputs, output=DEFAULT_OUTPUT, chunksize=200_000, restart=False):
+    """Normalize, deduplicate and append ``inputs`` into ``output``.
+
+    Returns a dict with the rows read, rows written and throughput.
+    """
+    checkpoint_path = output + ".checkpoint.json"
+    if restart:
+        for path in (output, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    checkpoint = _load_checkpoint(checkpoint_path)
+    seen = _existing_keys(output, chunksize)
+    write_header = not os.path.isfile(output) or os.path.getsize(output) == 0
+
+    start = time.perf_counter()
+    rows_read = rows_written = bad_lines = 0
+
+    for path in inputs:
+        if not os.path.isfile(path):
+            logging.warning("Skipping missing input %s", path)
+            continue
+        key = os.path.abspath(path)
+        state = checkpoint["files"].setdefault(key, {})
+        # Checkpoints that counted rows cannot be mapped to an offset; rows
+        # already written are skipped as duplicates
+        offset = state.get("offset", 0)
+        logging.info("Migrating %s (resuming at byte %d)", path, offset)
+
+        for raw, bad, offset in _read_chunks(path, offset, chunksize):
+            chunk = normalize_chunk(raw, canonical="currency" in raw.columns)
+            chunk = chunk.drop_duplicates(subset=["source", "currency", "collection_time"])
+            keys = _row_keys(chunk)
+            fresh = ~keys.isin(seen)
+            chunk = chunk[fresh]
+            seen.update(keys[fresh])
+
+            chunk.to_csv(output, mode="a", header=write_header, index=False, columns=FIELDNAMES)
+            write_header = False
+
+            rows_read += len(raw)
+            rows_written += len(chunk)
+            bad_lines += bad
+            state["offset"] = offset
+            _save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - start
+            logging.info(
+                "%s: %d rows read, %d written, %d bad lines skipped (%.0f rows/s)",
+                path,
+                rows_read,
+                rows_written,
+                bad_lines,
+                rows_read / elapsed if elapsed else 0.0,
+                extra={"phase": "migrate", "duration_ms": round(elapsed * 1000, 1)},
+            )
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows_read": rows_read,
+        "rows_written": rows_written,
+        "bad_lines": bad_lines,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows_read / elapsed) if elapsed else 0,
+    }
+
+
+def cutover(output=DEFAULT_OUTPUT, live=QUOTES_PATH, chunksize=200_000, export_dir=EXPORT_DIR):
+    """Replace the live quotes file with the migrated ``output``.
+
+    Holds the store lock so no collector appends in between, first
+    migrating what was appended to ``live`` since the last pass. The day
+    index and the columnar export checkpoint are dropped, since their
+    offsets describe the old file. The last-value index notices the new
+    file size and is rebuilt on its next load; heartbeats stay valid.
+    """
+    store = QuoteStore(live)
+    with store.locked():
+        summary = migrate([live], output, chunksize)
+        os.replace(output, live)
+        stale = (output + ".checkpoint.json", store.days_path, os.path.join(export_dir, STATE_NAME))
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+    logging.info("Replaced %s with the migrated %s", live, output)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", default=DEFAULT_INPUTS)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint and start over"
+    )
+    parser.add_argument(
+        "--cutover",
+        action="store_true",
+        help=f"after migrating, replace {QUOTES_PATH} with the output",
+    )
+    args = parser.parse_args(argv)
+
+    setup_logging("log/migrate_log.log")
+    summary = migrate(args.inputs, args.output, args.chunksize, args.restart)
+    logging.info(
+        "Migration finished: %(rows_read)d read, %(rows_written)d written, "
+        "%(bad_lines)d bad lines skipped in %(seconds)ss (%(rows_per_second)d rows/s)",
+        summary,
+    )
+    if args.cutover:
+        cutover(args.output, QUOTES_PATH, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
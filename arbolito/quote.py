@@ -0,0 +1,240 @@
+import re
+import unicodedata
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+FIELDNAMES = [
+    "collection_time",
+    "exchange_date",
+    "buy_rate",
+    "sell_rate",
+    "source",
+    "currency",
+    "status",
+]
+
+DEFAULT_CURRENCY = "USD"
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_CENTS = Decimal("0.01")
+
+# Argentine locale: "." groups thousands and "," is the decimal mark.
+# "$ 1.234,50", "1.234", "1140,0000" and already normalized "1234.5" all
+# match in a single pass; a lone "." followed by exactly three digits is
+# read as a thousands separator.
+_NUMBER_RE = re.compile(
+    r"""^\s*\$?\s*(?P<sign>-)?
+    (?:
+        (?P<grouped>\d{1,3}(?:\.\d{3})+)(?:,(?P<grouped_frac>\d+))?
+      | (?P<int>\d+)(?:[.,](?P<frac>\d+))?
+    )\s*$""",
+    re.VERBOSE,
+)
+
+# "24/4/2025", "24/04/2025", "2025-04-24" and "2025-04-24 16:14:02"
+_DATE_RE = re.compile(
+    r"^\s*(?:(?P<d>\d{1,2})/(?P<m>\d{1,2})/(?P<y>\d{4})"
+    r"|(?P<iy>\d{4})-(?P<im>\d{1,2})-(?P<id>\d{1,2}))"
+)
+
+
+# Checked in order, so qualified names ("Dolar Canadiense") win over the
+# generic ones ("Dolar")
+_CURRENCY_PATTERNS = [
+    (re.compile(pattern), code)
+    for pattern, code in (
+        (r"\bCANAD|\bCAD\b", "CAD"),
+        (r"\bAUSTRAL|\bAUD\b", "AUD"),
+        (r"\bURUGUAY|\bUYU\b", "UYU"),
+        (r"\bCHILEN|\bCLP\b", "CLP"),
+        (r"\bLIBRA|\bGBP\b", "GBP"),
+        (r"\bFRANCO|\bCHF\b", "CHF"),
+        (r"\bYEN|\bJPY\b", "JPY"),
+        (r"\bYUAN|\bCNY\b", "CNY"),
+        (r"\bREAL|\bBRL\b", "BRL"),
+        (r"\bEURO|\bEUR\b", "EUR"),
+        (r"\bDOLAR|\bU\.?S\.?A\b|\bUSD\b", "USD"),
+    )
+]
+
+
+def parse_currency(value):
+    """Map a bank's currency label ("Dolar U.S.A", "Euro", "Real *") to ISO 4217.
+
+    Returns None for labels that are not recognized.
+    """
+    text = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore")
+    text = text.decode("ascii").upper()
+    for pattern, code in _CURRENCY_PATTERNS:
+        if pattern.search(text):
+            return code
+    return None
+
+
+def parse_number(value):
+    """Parse an Argentine formatted amount into a Decimal.
+
+    Numbers that are not strings (floats from JSON endpoints) are converted
+    through their shortest repr. Raises ValueError when nothing matches.
+    """
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (int, float)):
+        try:
+            return Decimal(repr(value))
+        except InvalidOperation:
+            raise ValueError(f"Invalid number: {value!r}") from None
+    match = _NUMBER_RE.match(value or "")
+    if match is None:
+        raise ValueError(f"Invalid number: {value!r}")
+    grouped = match.group("grouped")
+    if grouped is not None:
+        integer, fraction = grouped.replace(".", ""), match.group("grouped_frac")
+    else:
+        integer, fraction = match.group("int"), match.group("frac")
+    text = integer if fraction is None else f"{integer}.{fraction}"
+    if match.group("sign"):
+        text = "-" + text
+    return Decimal(text)
+
+
+def parse_stored_number(value):
+    """Parse a rate read back from a CSV into a Decimal.
+
+    Canonical rows hold dot-decimal text ("215.125"), which must not go
+    through ``parse_number``: it would read the dot as a thousands
+    separator. Rows written before the migration keep their Argentine
+    format ("1.180,00") and fall back to it. Raises ValueError when nothing
+    matches.
+    """
+    if isinstance(value, Decimal):
+        return value
+    try:
+        number = Decimal(value)
+    except (InvalidOperation, TypeError):
+        return parse_number(value)
+    if not number.is_finite():
+        raise ValueError(f"Invalid number: {value!r}")
+    return number
+
+
+def parse_date(value):
+    """Parse a dd/mm/yyyy or ISO date (with or without time) into a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    match = _DATE_RE.match(value or "")
+    if match is None:
+        raise ValueError(f"Invalid date: {value!r}")
+    if match.group("y") is not None:
+        return date(int(match.group("y")), int(match.group("m")), int(match.group("d")))
+    return date(int(match.group("iy")), int(match.group("im")), int(match.group("id")))
+
+
+def format_rate(value):
+    """Canonical text for a rate: drop trailing zeros past the cents"""
+    if value is None:
+        return ""
+    cents = value.quantize(_CENTS)
+    return str(cents if cents == value else value.normalize())
+
+
+class Quote(namedtuple("Quote", FIELDNAMES)):
+    """One exchange rate observation, validated once at creation time.
+
+    Rates are Decimals, ``exchange_date`` a date and ``collection_time`` a
+    naive local datetime taken once per record.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def success(
+        cls,
+        source,
+        buy_rate,
+        sell_rate,
+        exchange_date=None,
+        collected_at=None,
+        currency=DEFAULT_CURRENCY,
+    ):
+        """Build a quote from raw scraped values, raising ValueError if invalid"""
+        collected_at = collected_at or datetime.now().replace(microsecond=0)
+        return cls(
+            collection_time=collected_at,
+            exchange_date=parse_date(exchange_date or collected_at),
+            buy_rate=parse_number(buy_rate),
+            sell_rate=parse_number(sell_rate),
+            source=source,
+            currency=currency,
+            status="Success",
+        )
+
+    @classmethod
+    def failure(cls, source, status, collected_at=None, currency=DEFAULT_CURRENCY):
+        """Build the record for a collection that did not produce rates"""
+        return cls(
+            collection_time=collected_at or datetime.now().replace(microsecond=0),
+            exchange_date=None,
+            buy_rate=None,
+            sell_rate=None,
+            source=source,
+            currency=currency,
+            status=status,
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a quote from a canonical CSV row (rows without currency are USD)"""
+        return cls(
+            collection_time=datetime.strptime(row["collection_time"], TIMESTAMP_FORMAT),
+            exchange_date=parse_date(row["exchange_date"]) if row["exchange_date"] else None,
+            buy_rate=parse_stored_number(row["buy_rate"]) if row["buy_rate"] else None,
+            sell_rate=parse_stored_number(row["sell_rate"]) if row["sell_rate"] else None,
+            source=row["source"],
+            currency=row.get("currency") or DEFAULT_CURRENCY,
+            status=row["status"],
+        )
+
+    @classmethod
+    def from_record(cls, record):
+        """Build a quote from the raw dicts of the standalone BNA scripts.
+
+        Unparseable successes become failures carrying the parse error.
+        """
+        source = record.get("source") or ""
+        try:
+            collected_at = datetime.strptime(record["collection_time"], TIMESTAMP_FORMAT)
+        except (KeyError, TypeError, ValueError):
+            collected_at = None
+        if record.get("status") != "Success":
+            return cls.failure(source, record.get("status") or "Error", collected_at)
+        try:
+            return cls.success(
+                source,
+                record["buy_rate"],
+                record["sell_rate"],
+                record.get("exchange_date") or None,
+                collected_at,
+            )
+        except (KeyError, ValueError) as e:
+            return cls.failure(source, f"Error: {e}", collected_at)
+
+    @property
+    def ok(self):
+        return self.status == "Success"
+
+    def to_row(self):
+        """Canonical CSV row: ISO dates and dot-decimal rates"""
+        return {
+            "collection_time": self.collection_time.strftime(TIMESTAMP_FORMAT),
+            "exchange_date": self.exchange_date.isoformat() if self.exchange_date else "",
+            "buy_rate": format_rate(self.buy_rate),
+            "sell_rate": format_rate(self.sell_rate),
+            "source": self.source,
+            "currency": self.currency,
+            "status": self.status,
+        }
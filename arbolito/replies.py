@@ -0,0 +1,236 @@
+"""Pre-rendered bot replies, cached per query until the data changes.
+
+A reply depends only on the query (kind, bank, currency, date) and on the
+quotes and comparison files, so the rendered text is kept in a bounded LRU
+under the current data version. The first lookup under a new version swaps
+in an empty cache in a single assignment, so a handler never sees a mix of
+old and new replies. ``warm`` renders the common queries as soon as the
+change stream reports a collection.
+"""
+
+import logging
+from collections import OrderedDict
+from datetime import date
+
+from arbolito.compare import COMPARISON_PATH, REFERENCE_SOURCE, load_comparison
+from arbolito.data import data_version
+from arbolito.health import STALE_AFTER, is_stale, load_health
+from arbolito.quote import DEFAULT_CURRENCY
+
+# Banks the bots offer in their welcome text
+COMMON_BANKS = ("BNA", "PROVINCIA", "CIUDAD", "BBVA", "TODOS")
+
+
+def _rate(value):
+    return "-" if value is None else f"${value:.2f}"
+
+
+def format_best(table, moneda=""):
+    """Best places to buy and sell a currency, from the persisted comparison"""
+    lines = []
+    if table["best_buy"]:
+        lines.append(
+            f"🟢 Comprar{moneda}: {table['best_buy']['source']} a {_rate(table['best_buy']['rate'])}"
+        )
+    if table["best_sell"]:
+        lines.append(
+            f"🔴 Vender{moneda}: {table['best_sell']['source']} a "
+            f"{_rate(table['best_sell']['rate'])}"
+        )
+    return "\n".join(lines)
+
+
+def format_all_banks(table, moneda="", reference=REFERENCE_SOURCE):
+    """TODOS reply: every bank's last rate, spread and gap to the reference"""
+    mensajes = []
+    for banco, bank in table["banks"].items():
+        lines = [
+            f"🏦 {banco}{moneda} ({bank['exchange_date']} {bank['collection_time'][11:]})"
+            + (" ⚠️ sin actualizar" if bank.get("stale") else ""),
+            f"🔸 Compra: {_rate(bank['buy'])}",
+            f"🔹 Venta: {_rate(bank['sell'])}",
+            f"↔️ Spread: {_rate(bank['spread'])}",
+        ]
+        if bank["vs_reference_pct"] is not None and banco != reference:
+            lines.append(f"📊 vs {reference}: {bank['vs_reference_pct']:+.2f}%")
+        mensajes.append("\n".join(lines))
+    best = format_best(table, moneda)
+    if best:
+        mensajes.append(best)
+    return "\n\n".join(mensajes)
+
+
+def _moneda(currency):
+    return "" if currency == DEFAULT_CURRENCY else f" ({currency})"
+
+
+def format_quote(row):
+    """Latest quote of one bank, as sent for "BNA" and inline queries"""
+    return (
+        f"📅 Cotización del {row.source}{_moneda(row.currency)} al {row.exchange_date} "
+        f"{row.collection_time:%H:%M:%S}:\n"
+        f"🔸 Compra: ${row.buy_rate}\n"
+        f"🔹 Venta: ${row.sell_rate}"
+    )
+
+
+def render_latest(quotes, bank, currency, fecha=None):
+    """Reply to "BNA EUR" or "TODOS" with the latest quotes; None if nothing matches"""
+    moneda = _moneda(currency)
+    if bank == "TODOS":
+        # Precomputed at every collection, with spreads and the best bank
+        comparison = load_comparison()
+        table = comparison["currencies"].get(currency) if comparison else None
+        if table:
+            return format_all_banks(table, moneda)
+
+    ultimas = quotes.latest(currency, None if bank == "TODOS" else bank)
+    if not ultimas:
+        return None
+    if bank != "TODOS":
+        return format_quote(max(ultimas, key=lambda row: row.collection_time))
+    return "\n\n".join(
+        f"🏦 {row.source}{moneda} ({row.exchange_date} {row.collection_time:%H:%M:%S})\n"
+        f"🔸 Compra: ${row.buy_rate}\n"
+        f"🔹 Venta: ${row.sell_rate}"
+        for row in ultimas
+    )
+
+
+def render_on_date(quotes, bank, currency, fecha=None):
+    """Reply to "bna eur 2025-04-25": quotes published for a date; None if nothing matches"""
+    moneda = _moneda(currency)
+    ultimas = quotes.latest(currency, None if bank == "TODOS" else bank, fecha)
+    if not ultimas:
+        return None
+    if bank != "TODOS":
+        row = max(ultimas, key=lambda row: row.collection_time)
+        return (
+            f"📅 Cotización del {row.source}{moneda} al {row.exchange_date}:\n"
+            f"🔸 Compra: ${row.buy_rate}\n"
+            f"🔹 Venta: ${row.sell_rate}"
+        )
+    return "\n\n".join(
+        f"🏦 {row.source}{moneda} ({row.exchange_date})\n"
+        f"🔸 Compra: ${row.buy_rate}\n"
+        f"🔹 Venta: ${row.sell_rate}"
+        for row in ultimas
+    )
+
+
+def render_best(quotes, bank, currency, fecha=None):
+    """/mejor reply from the persisted comparison; None without data"""
+    moneda = _moneda(currency)
+    comparison = load_comparison()
+    table = comparison["currencies"].get(currency) if comparison else None
+    if not table or not (table["best_buy"] or table["best_sell"]):
+        return None
+
+    lines = [format_best(table, moneda), ""]
+    for banco, quote in sorted(
+        table["banks"].items(), key=lambda item: item[1]["sell"] or float("inf")
+    ):
+        lines.append(
+            f"{banco}: compra {_rate(quote['buy'])} · venta {_rate(quote['sell'])} "
+            f"· spread {_rate(quote['spread'])}"
+            + (" ⚠️ sin actualizar" if quote.get("stale") else "")
+        )
+    lines.append(f"\nActualizado: {comparison['generated_at']}")
+    return "\n".join(lines)
+
+
+RENDERERS = {
+    "ultima": render_latest,
+    "fecha": render_on_date,
+    "mejor": render_best,
+}
+
+
+class ReplyCache:
+    """Bounded LRU of rendered replies for one data version at a time"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _current(self, version):
+        if version != self.version:
+            # Swap, never clear: the old dict stays intact for anyone holding it
+            self._entries = OrderedDict()
+            self.version = version
+        return self._entries
+
+    def get(self, key, version, render):
+        """Cached reply for ``key`` under ``version``, rendering it on a miss"""
+        entries = self._current(version)
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        reply = entries[key] = render()
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return reply
+
+
+REPLIES = ReplyCache()
+
+
+def reply_version(quotes):
+    """Version of everything a reply is rendered from"""
+    return (quotes.version, data_version(COMPARISON_PATH))
+
+
+def _cached_text(quotes, kind, bank, currency, fecha):
+    return REPLIES.get(
+        (kind, bank, currency, fecha),
+        reply_version(quotes),
+        lambda: RENDERERS[kind](quotes, bank, currency, fecha),
+    )
+
+
+def stale_note(bank=None, now=None):
+    """Warning naming the sources matching ``bank`` without a recent success"""
+    stale = [
+        source
+        for source, entry in load_health().items()
+        if (not bank or bank == "TODOS" or bank.upper() in source.upper())
+        and is_stale(entry, now)
+    ]
+    if not stale:
+        return ""
+    return (
+        f"⚠️ Sin actualizar hace más de {STALE_AFTER // 3600} horas: "
+        f"{', '.join(sorted(stale))} (ver /estado)"
+    )
+
+
+def cached_reply(quotes, kind, bank=None, currency=DEFAULT_CURRENCY, fecha=None):
+    """Reply text for a bot query, or None when no quote matches.
+
+    Replies about current quotes end with a staleness warning, checked on
+    every call since it depends on the clock rather than on the data.
+    """
+    text = _cached_text(quotes, kind, bank, currency, fecha)
+    if text is None or (kind == "fecha" and fecha not in (None, date.today())):
+        return text
+    note = stale_note(bank)
+    return f"{text}\n\n{note}" if note else text
+
+
+def warm(quotes, currencies=(DEFAULT_CURRENCY,)):
+    """Render the common queries for the current data ahead of the users"""
+    today = date.today()
+    for currency in currencies:
+        _cached_text(quotes, "mejor", None, currency, None)
+        for bank in COMMON_BANKS:
+            _cached_text(quotes, "ultima", bank, currency, None)
+            _cached_text(quotes, "fecha", bank, currency, None)
+            _cached_text(quotes, "fecha", bank, currency, today)
+    logging.info("Warmed %d bot replies for data version %s", len(REPLIES), REPLIES.version)
@@ -0,0 +1,169 @@
+import json
+import os
+from datetime import date, timedelta
+
+from arbolito.quote import DEFAULT_CURRENCY, TIMESTAMP_FORMAT
+from arbolito.store import QUOTES_PATH, QuoteStore, series_key
+
+ROLLUPS_PATH = os.path.join("data", "rollups.json")
+
+DAY = "day"
+WEEK = "week"
+MONTH = "month"
+TIERS = (DAY, WEEK, MONTH)
+
+_cache = {}
+
+
+def bucket_key(tier, day):
+    """Bucket of ``day`` in ``tier``: the day, the Monday of its week or its month"""
+    if tier == DAY:
+        return day.isoformat()
+    if tier == WEEK:
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.strftime("%Y-%m")
+
+
+def tier_for(days):
+    """Coarsest tier that still gives a useful number of points for ``days``"""
+    if days <= 31:
+        return DAY
+    if days <= 182:
+        return WEEK
+    return MONTH
+
+
+def _bucket_keys(tier, start, end):
+    keys = []
+    day = start
+    while day <= end:
+        key = bucket_key(tier, day)
+        if not keys or keys[-1] != key:
+            keys.append(key)
+        day += timedelta(days=1) if tier == DAY else timedelta(days=7 if tier == WEEK else 28)
+    last = bucket_key(tier, end)
+    if keys[-1] != last:
+        keys.append(last)
+    return keys
+
+
+def _add(bucket, collected, buy, sell):
+    if bucket is None:
+        return {
+            "open": sell,
+            "high": sell,
+            "low": sell,
+            "close": sell,
+            "sum": sell,
+            "spread_sum": sell - buy,
+            "count": 1,
+            "first": collected,
+            "last": collected,
+        }
+    bucket["high"] = max(bucket["high"], sell)
+    bucket["low"] = min(bucket["low"], sell)
+    bucket["close"] = sell
+    bucket["sum"] += sell
+    bucket["spread_sum"] += sell - buy
+    bucket["count"] += 1
+    bucket["last"] = collected
+    return bucket
+
+
+def summarize(buckets):
+    """Combine consecutive buckets into one open/high/low/close summary"""
+    count = sum(bucket["count"] for bucket in buckets)
+    return {
+        "open": buckets[0]["open"],
+        "high": max(bucket["high"] for bucket in buckets),
+        "low": min(bucket["low"] for bucket in buckets),
+        "close": buckets[-1]["close"],
+        "mean": sum(bucket["sum"] for bucket in buckets) / count,
+        "spread": sum(bucket["spread_sum"] for bucket in buckets) / count,
+        "count": count,
+    }
+
+
+class Rollups:
+    """Daily, weekly and monthly OHLC of the sell rate for every series.
+
+    Each bucket holds open/high/low/close, the running sum (for the mean),
+    the summed buy/sell spread and the sample count, so new quotes are
+    folded in without rereading the history and a range query only touches
+    the buckets it covers. ``watermark`` keeps the last collection time
+    folded per series, which makes repeated updates idempotent. When the
+    file does not exist yet, or with ``rebuild`` (history loaded behind the
+    watermark), it is built from the quotes CSV and its heartbeats, so an
+    unchanged rate counts once per collection either way.
+    """
+
+    def __init__(self, path=ROLLUPS_PATH, quotes_path=QUOTES_PATH, rebuild=False):
+        self.path = path
+        self.version = None
+        data = None
+        if not rebuild:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        if data is None:
+            self.watermark = {}
+            self.tiers = {tier: {} for tier in TIERS}
+            self.update(QuoteStore(quotes_path).collected_quotes())
+        else:
+            self.watermark = data["watermark"]
+            self.tiers = data["tiers"]
+
+    def update(self, quotes):
+        """Fold successful quotes newer than their series watermark; returns how many"""
+        added = 0
+        for quote in sorted(
+            (quote for quote in quotes if quote.ok), key=lambda quote: quote.collection_time
+        ):
+            key = series_key(quote.source, quote.currency)
+            collected = quote.collection_time.strftime(TIMESTAMP_FORMAT)
+            if key in self.watermark and collected <= self.watermark[key]:
+                continue
+            self.watermark[key] = collected
+            buy, sell = float(quote.buy_rate), float(quote.sell_rate)
+            day = quote.collection_time.date()
+            for tier in TIERS:
+                buckets = self.tiers[tier].setdefault(key, {})
+                bucket = bucket_key(tier, day)
+                buckets[bucket] = _add(buckets.get(bucket), collected, buy, sell)
+            added += 1
+        return added
+
+    def series(self):
+        return list(self.watermark)
+
+    def history(self, source, currency=DEFAULT_CURRENCY, days=30, today=None, tier=None):
+        """(tier, [(bucket key, bucket)]) for the last ``days`` days of a series"""
+        tier = tier or tier_for(days)
+        end = today or date.today()
+        buckets = self.tiers[tier].get(series_key(source, currency), {})
+        keys = _bucket_keys(tier, end - timedelta(days=days - 1), end)
+        return tier, [(key, buckets[key]) for key in keys if key in buckets]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"watermark": self.watermark, "tiers": self.tiers}, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_rollups(path=ROLLUPS_PATH):
+    """Rollups for read-only use, re-read only when the file changes"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is None or cached[0] != version:
+        rollups = Rollups(path)
+        rollups.version = version
+        cached = _cache[path] = (version, rollups)
+    return cached[1]
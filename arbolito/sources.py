@@ -0,0 +1,559 @@
+"""Bank source adapters and cost-based choice of fetch strategy.
+
+Each bank is an ``Adapter`` listing the ways its rates can be fetched, as
+``Strategy`` entries: a kind (JSON endpoint, static HTML, Selenium or
+Playwright rendered HTML), a URL and an extractor that turns the fetched
+payload into ``(currency, buy, sell, exchange_date)`` tuples. Browser
+strategies hand the rendered page source to the same extractors as the
+static HTML ones.
+
+``SourceRunner`` tries the strategies of a source cheapest first and stops
+at the first that yields quotes. ``StrategyStats`` keeps, per source and
+strategy, a moving average of latency and success and orders them by
+expected time to a successful fetch. Strategies that keep failing are
+moved to the end and re-probed after a cool-down that doubles while they
+stay broken, so each source converges on its fastest working path and the
+expensive browsers only run when nothing cheaper works.
+
+Adding a bank is one ``Adapter`` in ``ADAPTERS`` plus its extractor.
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+
+from arbolito.health import backoff_delay, classify_error
+from arbolito.lazy import lazy_import
+from arbolito.quote import TIMESTAMP_FORMAT, Quote, parse_currency, parse_number
+
+STRATEGY_STATS_PATH = os.path.join("data", "strategy_stats.json")
+
+JSON = "json"
+HTML = "html"
+SELENIUM = "selenium"
+PLAYWRIGHT = "playwright"
+
+# Assumed latency in ms of each kind until it has been measured
+PRIOR_LATENCY_MS = {JSON: 800, HTML: 1500, PLAYWRIGHT: 9000, SELENIUM: 15000}
+BROWSER_KINDS = (SELENIUM, PLAYWRIGHT)
+# Module a kind needs; strategies whose module is missing are skipped
+_KIND_MODULES = {JSON: "requests", HTML: "requests", SELENIUM: "selenium", PLAYWRIGHT: "playwright"}
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+
+
+class Strategy(namedtuple("Strategy", "kind url extract options")):
+    """One way of fetching a source; ``options`` tune the fetcher.
+
+    Options: ``headers``, ``warmup`` (URL visited first for cookies),
+    ``cache_buster`` (add a ``_`` timestamp parameter), ``retries``,
+    ``timeout`` (seconds) and ``wait`` (seconds a browser lets the page
+    render).
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, kind, url, extract, options=None):
+        return super().__new__(cls, kind, url, extract, options or {})
+
+
+Adapter = namedtuple("Adapter", "key source strategies")
+
+
+class _PageParser(HTMLParser):
+    """Collects the table rows inside the element with id ``container`` and
+    the text of the elements whose class contains ``text_class``"""
+
+    def __init__(self, container=None, text_class=None):
+        super().__init__()
+        self.container = container
+        self.text_class = text_class
+        self.rows = []
+        self.texts = []
+        self._container_tag = None
+        self._container_depth = 0
+        self._row = None
+        self._cell = None
+        self._capture = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self._container_tag is None:
+            if self.container is not None and attrs.get("id") == self.container:
+                self._container_tag, self._container_depth = tag, 1
+        elif tag == self._container_tag:
+            self._container_depth += 1
+
+        if self._capture is not None:
+            if tag == self._capture[0]:
+                self._capture[1] += 1
+        elif self.text_class and self.text_class in (attrs.get("class") or ""):
+            self._capture = [tag, 1, []]
+
+        if self._container_tag is None and self.container is not None:
+            return
+        if tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if self._capture is not None and tag == self._capture[0]:
+            self._capture[1] -= 1
+            if not self._capture[1]:
+                self.texts.append(" ".join("".join(self._capture[2]).split()))
+                self._capture = None
+
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._row:
+                self.rows.append(self._row)
+            self._row = None
+
+        if tag == self._container_tag:
+            self._container_depth -= 1
+            if not self._container_depth:
+                self._container_tag = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+        if self._capture is not None:
+            self._capture[2].append(data)
+
+
+# BNA marks with "*" the currencies quoted per this many units (the Real)
+BNA_MARKED_UNITS = 100
+
+
+def extract_bna(html):
+    """Every currency of the BNA billetes table, dated with its fechaCot.
+
+    Rows marked "*" ("Real *") are quoted per 100 units and are brought
+    down to one unit like the other banks' rates.
+    """
+    parser = _PageParser(container="billetes", text_class="fechaCot")
+    parser.feed(html)
+    exchange_date = parser.texts[0] if parser.texts else None
+    rates = []
+    for cells in parser.rows:
+        currency = parse_currency(cells[0]) if len(cells) >= 3 else None
+        if currency is None:
+            continue
+        buy, sell = cells[1], cells[2]
+        if cells[0].rstrip().endswith("*"):
+            buy = parse_number(buy) / BNA_MARKED_UNITS
+            sell = parse_number(sell) / BNA_MARKED_UNITS
+        rates.append((currency, buy, sell, exchange_date))
+    return rates
+
+
+def extract_provincia(html):
+    """The dollar "Compra: $" / "Venta: $" boxes of the Banco Provincia home page"""
+    parser = _PageParser(text_class="paginas__sc-1t8sitw-1")
+    parser.feed(html)
+    if len(parser.texts) < 2:
+        raise ValueError("Could not find both buy and sell rate elements")
+    buy = parser.texts[0].replace("Compra: $", "").strip()
+    sell = parser.texts[1].replace("Venta: $", "").strip()
+    return [("USD", buy, sell, None)]
+
+
+def extract_bbva(data):
+    """Every currency of the BBVA JSON endpoint (the first entry of each)"""
+    rates = {}
+    for item in data.get("respuesta", []):
+        currency = parse_currency(item.get("moneda", {}).get("descripcionLarga", ""))
+        if currency is not None and currency not in rates:
+            rates[currency] = (currency, item["precioCompra"], item["precioVenta"], None)
+    return list(rates.values())
+
+
+def extract_ciudad(data):
+    """Every currency of the Banco Ciudad JSON (one {"compra", "venta"} per name)"""
+    rates = []
+    for name, values in data["data"].items():
+        currency = parse_currency(name)
+        if currency is None or not isinstance(values, dict):
+            continue
+        if "compra" in values and "venta" in values:
+            rates.append((currency, values["compra"], values["venta"], None))
+    return rates
+
+
+BNA_URL = "https://www.bna.com.ar/"
+PROVINCIA_URL = "https://www.bancoprovincia.com.ar/"
+BBVA_URL = "https://servicios.bbva.com.ar/openmarket/servicios/cotizaciones/monedaExtranjera"
+CIUDAD_URL = "https://bancociudad.com.ar/institucional/herramientas/getCotizacionesInicio"
+
+CIUDAD_HEADERS = {
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Accept-Language": "en-US,en;q=0.9",
+    "User-Agent": USER_AGENT,
+    "X-Requested-With": "XMLHttpRequest",
+    "Referer": "https://bancociudad.com.ar/institucional/",
+    "Connection": "keep-alive",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-origin",
+}
+
+ADAPTERS = {
+    adapter.key: adapter
+    for adapter in (
+        Adapter(
+            "bna",
+            "BNA",
+            [
+                Strategy(HTML, BNA_URL, extract_bna),
+                Strategy(PLAYWRIGHT, BNA_URL, extract_bna),
+                Strategy(SELENIUM, BNA_URL, extract_bna, {"wait": 5}),
+            ],
+        ),
+        Adapter(
+            "provincia",
+            "Banco Provincia",
+            [
+                Strategy(PLAYWRIGHT, PROVINCIA_URL, extract_provincia),
+                Strategy(SELENIUM, PROVINCIA_URL, extract_provincia, {"wait": 5}),
+            ],
+        ),
+        Adapter("bbva", "BBVA", [Strategy(JSON, BBVA_URL, extract_bbva)]),
+        Adapter(
+            "ciudad",
+            "Banco Ciudad",
+            [
+                Strategy(
+                    JSON,
+                    CIUDAD_URL,
+                    extract_ciudad,
+                    {
+                        "headers": CIUDAD_HEADERS,
+                        "warmup": "https://bancociudad.com.ar/institucional/",
+                        "cache_buster": True,
+                        "retries": 3,
+                    },
+                ),
+            ],
+        ),
+    )
+}
+
+
+def start_browser(browse):
+    """Start the browser 'edge' or 'chrome' with the specified options"""
+    webdriver = lazy_import("selenium.webdriver")
+    if browse == "edge":
+        options = webdriver.EdgeOptions()
+        options.use_chromium = True
+        options.add_argument("--headless")
+        options.add_argument("--disable-gpu")
+        driver = webdriver.Edge(options=options)
+    elif browse == "chrome":
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        options.add_argument("--disable-gpu")
+        driver = webdriver.Chrome(options=options)
+    else:
+        raise ValueError("Unsupported browser type. Use 'edge' or 'chrome'.")
+    return driver
+
+
+def _fetch_json(strategy, timeout, browser):
+    requests = lazy_import("requests")
+    options = strategy.options
+    session = requests.Session()
+    session.headers.update(options.get("headers") or {"User-Agent": USER_AGENT})
+    if options.get("warmup"):
+        try:
+            session.get(options["warmup"], timeout=timeout)
+        except Exception as e:
+            logging.warning("Failed to get initial cookies from %s: %s", options["warmup"], e)
+    params = {"_": int(datetime.now().timestamp() * 1000)} if options.get("cache_buster") else None
+    response = session.get(strategy.url, params=params, timeout=timeout)
+    response.raise_for_status()
+    try:
+        return response.json()
+    except ValueError:
+        if "CAPTCHA" in response.text:
+            raise Exception("CAPTCHA detected") from None
+        raise Exception(f"Failed to decode JSON from {strategy.url}") from None
+
+
+def _fetch_html(strategy, timeout, browser):
+    requests = lazy_import("requests")
+    headers = strategy.options.get("headers") or {"User-Agent": USER_AGENT}
+    response = requests.get(strategy.url, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+def _fetch_selenium(strategy, timeout, browser):
+    driver = start_browser(browser)
+    try:
+        driver.set_page_load_timeout(timeout)
+        driver.get(strategy.url)
+        driver.maximize_window()
+        time.sleep(strategy.options.get("wait", 5))  # Let the page render its rates
+        return driver.page_source
+    finally:
+        try:
+            driver.quit()
+        except Exception:
+            logging.warning("Could not properly close the browser session for %s", strategy.url)
+
+
+def _fetch_playwright(strategy, timeout, browser):
+    sync_playwright = lazy_import("playwright.sync_api").sync_playwright
+    with sync_playwright() as playwright:
+        chromium = playwright.chromium.launch(headless=True)
+        try:
+            page = chromium.new_page(user_agent=USER_AGENT)
+            page.goto(strategy.url, wait_until="networkidle", timeout=timeout * 1000)
+            if strategy.options.get("wait"):
+                page.wait_for_timeout(strategy.options["wait"] * 1000)
+            return page.content()
+        finally:
+            chromium.close()
+
+
+FETCHERS = {
+    JSON: _fetch_json,
+    HTML: _fetch_html,
+    SELENIUM: _fetch_selenium,
+    PLAYWRIGHT: _fetch_playwright,
+}
+
+
+def kind_available(kind):
+    return importlib.util.find_spec(_KIND_MODULES[kind]) is not None
+
+
+class StrategyStats:
+    """Moving averages of latency and success per source and strategy, persisted as JSON.
+
+    Strategies are ordered by expected time to a success, ``latency /
+    success``. After two failures in a row a strategy is suspended: it is
+    only tried after the working ones until its re-probe time, which starts
+    at ``reprobe_after`` seconds and doubles with each further failure (up
+    to 8x). When it is due, it is ranked by latency alone, so a cheap path
+    that recovered wins back its place on the first try.
+    """
+
+    def __init__(self, path=STRATEGY_STATS_PATH, reprobe_after=6 * 3600, alpha=0.3):
+        self.path = path
+        self.reprobe_after = reprobe_after
+        self.alpha = alpha
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.sources = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.sources = {}
+
+    def entry(self, source, kind):
+        return self.sources.setdefault(source, {}).setdefault(
+            kind,
+            {
+                "latency_ms": PRIOR_LATENCY_MS[kind],
+                "success": 0.5,
+                "attempts": 0,
+                "failures": 0,
+                "consecutive_failures": 0,
+                "last_attempt": None,
+                "last_success": None,
+            },
+        )
+
+    def record(self, source, kind, seconds, ok, now=None):
+        now = (now or datetime.now()).strftime(TIMESTAMP_FORMAT)
+        entry = self.entry(source, kind)
+        if entry["attempts"] == 0 and ok:
+            entry["latency_ms"] = seconds * 1000
+        elif ok:
+            # Failures often end early or on a timeout: only successes say
+            # how long a useful fetch takes
+            entry["latency_ms"] += self.alpha * (seconds * 1000 - entry["latency_ms"])
+        entry["success"] += self.alpha * ((1.0 if ok else 0.0) - entry["success"])
+        entry["attempts"] += 1
+        entry["last_attempt"] = now
+        if ok:
+            entry["consecutive_failures"] = 0
+            entry["last_success"] = now
+        else:
+            entry["failures"] += 1
+            entry["consecutive_failures"] += 1
+
+    def suspended_until(self, source, kind):
+        """End of a suspended strategy's cool-down, or None if it is not suspended"""
+        entry = self.entry(source, kind)
+        failures = entry["consecutive_failures"]
+        if failures < 2 or not entry["last_attempt"]:
+            return None
+        seconds = self.reprobe_after * 2 ** min(failures - 2, 3)
+        return datetime.strptime(entry["last_attempt"], TIMESTAMP_FORMAT) + timedelta(
+            seconds=seconds
+        )
+
+    def cost(self, source, kind, now=None):
+        """Expected ms until a successful fetch with this strategy"""
+        entry = self.entry(source, kind)
+        until = self.suspended_until(source, kind)
+        if until is not None and (now or datetime.now()) >= until:
+            return entry["latency_ms"]
+        return entry["latency_ms"] / max(entry["success"], 0.05)
+
+    def plan(self, adapter, now=None):
+        """Available strategies of ``adapter`` in the order to try them"""
+        now = now or datetime.now()
+        working, suspended = [], []
+        for strategy in adapter.strategies:
+            if not kind_available(strategy.kind):
+                continue
+            until = self.suspended_until(adapter.source, strategy.kind)
+            bucket = suspended if until is not None and now < until else working
+            bucket.append((self.cost(adapter.source, strategy.kind, now), strategy))
+        working.sort(key=lambda item: item[0])
+        suspended.sort(key=lambda item: item[0])
+        return [strategy for _, strategy in working + suspended]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.sources, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class SourceRunner:
+    """Fetches a source through its cheapest working strategy"""
+
+    def __init__(self, stats=None, governor=None, browser="chrome", deadline=None):
+        self.stats = stats or StrategyStats()
+        self.governor = governor
+        self.browser = browser
+        self.deadline = deadline
+        # source -> strategy kind of its last successful fetch
+        self.used = {}
+
+    def _timeout(self, strategy):
+        timeout = strategy.options.get("timeout", 30 if strategy.kind in BROWSER_KINDS else 10)
+        if self.deadline is not None:
+            timeout = max(1, min(timeout, self.deadline.remaining()))
+        return timeout
+
+    def _fetch(self, adapter, strategy):
+        """Payload of one attempt, holding a browser slot for browser kinds"""
+        slot = nullcontext()
+        if strategy.kind in BROWSER_KINDS and self.governor is not None:
+            slot = self.governor.session(adapter.source, self.deadline)
+        with slot:
+            return FETCHERS[strategy.kind](strategy, self._timeout(strategy), self.browser)
+
+    def attempt(self, adapter, strategy, probe=False):
+        """Quotes from one strategy, retrying with backoff; raises when it fails"""
+        retries = 1 if probe else strategy.options.get("retries", 1)
+        for attempt in range(retries):
+            try:
+                payload = self._fetch(adapter, strategy)
+                collected_at = datetime.now().replace(microsecond=0)
+                quotes = [
+                    Quote.success(adapter.source, buy, sell, exchange_date, collected_at, currency)
+                    for currency, buy, sell, exchange_date in strategy.extract(payload)
+                ]
+                if not quotes:
+                    raise Exception("No currency rates found")
+                return quotes
+            except Exception as e:
+                delay = backoff_delay(attempt, deadline=self.deadline)
+                if (
+                    attempt == retries - 1
+                    or classify_error(str(e)) == "captcha"
+                    or (self.deadline is not None and self.deadline.remaining() <= delay)
+                ):
+                    raise
+                logging.warning(
+                    "Attempt %d of %s via %s failed: %s",
+                    attempt + 1,
+                    adapter.source,
+                    strategy.kind,
+                    e,
+                    extra={"source": adapter.source, "phase": "fetch"},
+                )
+                time.sleep(delay)
+
+    def fetch(self, adapter, probe=False):
+        """Quotes of ``adapter``, or one failure quote naming every error.
+
+        A ``probe`` (the circuit breaker's half-open attempt) only tries the
+        cheapest strategy, once, without falling back to the others.
+        """
+        plan = self.stats.plan(adapter)
+        if probe:
+            plan = plan[:1]
+        logging.info(
+            "Collecting %s via %s",
+            adapter.source,
+            " > ".join(strategy.kind for strategy in plan) or "no available strategy",
+            extra={"source": adapter.source, "phase": "fetch"},
+        )
+        errors = []
+        for strategy in plan:
+            if self.deadline is not None and self.deadline.expired:
+                errors.append("run deadline reached")
+                break
+            started = time.perf_counter()
+            try:
+                quotes = self.attempt(adapter, strategy, probe)
+            except Exception as e:
+                self.stats.record(adapter.source, strategy.kind, time.perf_counter() - started, False)
+                logging.error(
+                    "%s via %s failed: %s",
+                    adapter.source,
+                    strategy.kind,
+                    e,
+                    extra={"source": adapter.source, "phase": "fetch"},
+                )
+                errors.append(f"{strategy.kind}: {e}")
+                continue
+
+            elapsed = time.perf_counter() - started
+            self.stats.record(adapter.source, strategy.kind, elapsed, True)
+            self.used[adapter.source] = strategy.kind
+            for quote in quotes:
+                logging.info(
+                    "%s %s rates via %s: Buy=%s, Sell=%s",
+                    adapter.source,
+                    quote.currency,
+                    strategy.kind,
+                    quote.buy_rate,
+                    quote.sell_rate,
+                    extra={
+                        "source": adapter.source,
+                        "phase": "extract",
+                        "duration_ms": round(elapsed * 1000, 1),
+                    },
+                )
+            return quotes
+
+        self.used.pop(adapter.source, None)
+        return [
+            Quote.failure(adapter.source, "Error: " + ("; ".join(errors) or "no available strategy"))
+        ]
+
+    def backend(self, source):
+        """Backend of the last successful fetch of ``source`` ("selenium/chrome", "json")"""
+        kind = self.used.get(source)
+        if kind == SELENIUM:
+            return f"{SELENIUM}/{self.browser}"
+        return kind
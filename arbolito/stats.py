@@ -0,0 +1,197 @@
+import json
+import math
+import os
+from collections import deque
+from datetime import datetime
+
+from arbolito.quote import TIMESTAMP_FORMAT
+from arbolito.store import QUOTES_PATH, QuoteStore, series_key
+
+STATS_PATH = os.path.join("data", "rolling_stats.json")
+
+# Window name -> length in seconds
+WINDOWS = {"1d": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+# Half-life of the exponentially weighted average, in seconds
+EWMA_HALF_LIFE = 86400
+
+_cache = {}
+
+
+class RollingWindow:
+    """Sell rates of the last ``seconds``, with O(1) amortized updates.
+
+    Keeps the running sum and sum of squares for the mean and standard
+    deviation, and monotonic deques whose fronts are the minimum and
+    maximum. Each sample enters and leaves every structure once.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()
+        self.total = 0.0
+        self.squares = 0.0
+        self.lows = deque()
+        self.highs = deque()
+
+    def push(self, ts, value):
+        self.samples.append((ts, value))
+        self.total += value
+        self.squares += value * value
+        while self.lows and self.lows[-1][1] >= value:
+            self.lows.pop()
+        self.lows.append((ts, value))
+        while self.highs and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.highs.append((ts, value))
+        self.evict(ts)
+
+    def evict(self, now):
+        start = now - self.seconds
+        while self.samples and self.samples[0][0] <= start:
+            _, value = self.samples.popleft()
+            self.total -= value
+            self.squares -= value * value
+        while self.lows and self.lows[0][0] <= start:
+            self.lows.popleft()
+        while self.highs and self.highs[0][0] <= start:
+            self.highs.popleft()
+        if not self.samples:
+            # Drop accumulated rounding error whenever the window empties
+            self.total = self.squares = 0.0
+
+    def summary(self):
+        count = len(self.samples)
+        if not count:
+            return None
+        mean = self.total / count
+        variance = (self.squares - count * mean * mean) / (count - 1) if count > 1 else 0.0
+        return {
+            "count": count,
+            "mean": mean,
+            "std": math.sqrt(max(variance, 0.0)),
+            "min": self.lows[0][1],
+            "max": self.highs[0][1],
+            "first": self.samples[0][1],
+            "last": self.samples[-1][1],
+        }
+
+
+class RollingStats:
+    """Per-series rolling windows and EWMA of the sell rate, persisted as JSON.
+
+    Like the rollups, a watermark per series makes updates idempotent and
+    the state is built from the quotes CSV and its heartbeats when the file
+    is missing or with ``rebuild``.
+    """
+
+    def __init__(self, path=STATS_PATH, quotes_path=QUOTES_PATH, rebuild=False):
+        self.path = path
+        self.version = None
+        self.series = {}
+        data = None
+        if not rebuild:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        if data is None:
+            self.update(QuoteStore(quotes_path).collected_quotes())
+            return
+        for key, saved in data.items():
+            entry = self._entry(key)
+            entry["watermark"] = saved["watermark"]
+            entry["ewma"] = saved["ewma"]
+            # Only the longest window is stored; the shorter ones are its tail
+            for ts, value in saved["samples"]:
+                for window in entry["windows"].values():
+                    window.push(ts, value)
+
+    def _entry(self, key):
+        entry = self.series.get(key)
+        if entry is None:
+            entry = self.series[key] = {
+                "watermark": "",
+                "ewma": None,
+                "windows": {name: RollingWindow(seconds) for name, seconds in WINDOWS.items()},
+            }
+        return entry
+
+    def update(self, quotes):
+        """Fold successful quotes newer than their series watermark; returns how many"""
+        added = 0
+        for quote in sorted(
+            (quote for quote in quotes if quote.ok), key=lambda quote: quote.collection_time
+        ):
+            entry = self._entry(series_key(quote.source, quote.currency))
+            collected = quote.collection_time.strftime(TIMESTAMP_FORMAT)
+            if collected <= entry["watermark"]:
+                continue
+            entry["watermark"] = collected
+            ts = quote.collection_time.timestamp()
+            value = float(quote.sell_rate)
+            for window in entry["windows"].values():
+                window.push(ts, value)
+
+            ewma = entry["ewma"]
+            if ewma is None:
+                entry["ewma"] = {"ts": ts, "value": value}
+            else:
+                # Time-aware smoothing: irregular collection gaps weigh correctly
+                weight = 1 - 0.5 ** ((ts - ewma["ts"]) / EWMA_HALF_LIFE)
+                ewma["value"] += weight * (value - ewma["value"])
+                ewma["ts"] = ts
+            added += 1
+        return added
+
+    def summary(self, source, currency, window, now=None):
+        """Stats of one series over ``window`` ("1d", "7d", "30d"), or None"""
+        entry = self.series.get(series_key(source, currency))
+        if entry is None:
+            return None
+        rolling = entry["windows"][window]
+        rolling.evict((now or datetime.now()).timestamp())
+        summary = rolling.summary()
+        if summary is not None:
+            summary["ewma"] = entry["ewma"]["value"]
+            summary["updated"] = entry["watermark"]
+        return summary
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        longest = max(WINDOWS, key=WINDOWS.get)
+        data = {
+            key: {
+                "watermark": entry["watermark"],
+                "ewma": entry["ewma"],
+                "samples": [list(sample) for sample in entry["windows"][longest].samples],
+            }
+            for key, entry in self.series.items()
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+def window_for(days):
+    """Smallest window covering ``days``, capped at the longest one"""
+    for name, seconds in WINDOWS.items():
+        if days * 86400 <= seconds:
+            return name
+    return name
+
+
+def load_stats(path=STATS_PATH):
+    """Rolling stats for read-only use, re-read only when the file changes"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is None or cached[0] != version:
+        stats = RollingStats(path)
+        stats.version = version
+        cached = _cache[path] = (version, stats)
+    return cached[1]
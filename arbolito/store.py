@@ -0,0 +1,503 @@
+import bisect
+import csv
+import io
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from arbolito.quote import (
+    DEFAULT_CURRENCY,
+    FIELDNAMES,
+    TIMESTAMP_FORMAT,
+    Quote,
+    parse_date,
+    parse_stored_number,
+)
+
+QUOTES_PATH = os.path.join("data", "exchange_rates_v2.csv")
+
+HEARTBEAT_FIELDNAMES = ["source", "currency", "seen_at"]
+
+
+def series_key(source, currency=DEFAULT_CURRENCY):
+    """Key of one quote series in the last-value index ("BNA|USD")"""
+    return f"{source}|{currency}"
+
+
+class QuoteStore:
+    """Append-only quote history that only stores rate changes.
+
+    Next to the quotes CSV the store keeps:
+
+    * ``<name>_last.json``: last written value per (source, currency) plus
+      the last time it was seen, loaded once and persisted after every append.
+      It records the sizes of the CSV and heartbeat files it describes and is
+      rebuilt from them when they differ (a writer died between the append
+      and the index save, or the file was replaced).
+    * ``<name>_heartbeats.csv``: one short ``source,currency,seen_at`` line
+      each time a collection confirmed an unchanged rate.
+    * ``<name>_days.json``: byte offset of the first row of every collection
+      day, extended incrementally, so date ranges are read without a scan.
+
+    Every collector writes through ``append``, which holds an advisory lock
+    on ``<name>.lock`` while it reloads the index, appends and saves, so
+    concurrent writers neither interleave rows nor store duplicates.
+
+    The rate at any time T is the last quote row at or before T, and the
+    heartbeats tell until when it was still being confirmed. Files written
+    before the ``currency`` column existed are upgraded in place (as USD) on
+    the first append.
+    """
+
+    def __init__(self, path=QUOTES_PATH):
+        self.path = path
+        base, _ = os.path.splitext(path)
+        self.index_path = base + "_last.json"
+        self.heartbeat_path = base + "_heartbeats.csv"
+        self.days_path = base + "_days.json"
+        self.lock_path = base + ".lock"
+        self._last = None
+        self._history_keys = None
+
+    def last_values(self):
+        """Return the last-value index, loading it on first use"""
+        if self._last is None:
+            try:
+                with open(self.index_path, encoding="utf-8") as f:
+                    saved = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                saved = None
+            # Indexes written before the sizes were recorded are a bare mapping
+            if not isinstance(saved, dict) or "series" not in saved:
+                self._last = self._rebuild_index()
+            elif saved.get("sizes") != self._sizes():
+                logging.warning(
+                    "Last-value index of %s does not match the files, rebuilding", self.path
+                )
+                self._last = self._rebuild_index()
+            else:
+                self._last = saved["series"]
+        return self._last
+
+    def _sizes(self):
+        """Current sizes of the quotes and heartbeat files (0 when missing)"""
+        return {
+            "quotes": os.path.getsize(self.path) if os.path.isfile(self.path) else 0,
+            "heartbeats": (
+                os.path.getsize(self.heartbeat_path) if os.path.isfile(self.heartbeat_path) else 0
+            ),
+        }
+
+    def _rebuild_index(self):
+        """Scan the quotes CSV once to recover the last value per series"""
+        last = {}
+        for row in _read_rows(self.path):
+            if row.get("status") != "Success":
+                continue
+            try:
+                quote = Quote.from_row(row)
+            except (KeyError, ValueError):
+                continue
+            key = series_key(quote.source, quote.currency)
+            # Backfilled history is appended after newer rows
+            if key not in last or last[key]["collection_time"] <= row["collection_time"]:
+                last[key] = _index_entry(quote)
+        for beat in _read_rows(self.heartbeat_path):
+            key = series_key(beat["source"], beat.get("currency") or DEFAULT_CURRENCY)
+            entry = last.get(key)
+            if entry is not None and beat["seen_at"] > entry["seen_at"]:
+                entry["seen_at"] = beat["seen_at"]
+        if last:
+            logging.info("Rebuilt last-value index for %d series", len(last))
+        return last
+
+    def append(self, quotes):
+        """Write the quotes that carry new information.
+
+        Failed collections are not stored, unchanged rates become
+        heartbeats, and quotes not newer than the last one seen for their
+        series (overlapping runs, replays) are rejected. Returns a dict with
+        the number of ``written``, ``heartbeats`` and ``duplicates``, and
+        the written CSV ``rows``.
+
+        Each call is one group commit: the new rows are written with a
+        single ``write`` and ``fsync`` per file, under the store lock.
+        """
+        with _file_lock(self.lock_path):
+            # Another writer may have appended since the index was loaded
+            self._last = None
+            return self._append_locked(quotes)
+
+    def _append_locked(self, quotes):
+        last = self.last_values()
+        rows, heartbeats, duplicates = [], [], 0
+
+        for quote in quotes:
+            if not quote.ok:
+                continue
+            key = series_key(quote.source, quote.currency)
+            seen_at = quote.collection_time.strftime(TIMESTAMP_FORMAT)
+            previous = last.get(key)
+            if previous is not None and seen_at <= previous["seen_at"]:
+                duplicates += 1
+            elif previous is not None and _unchanged(previous, quote):
+                previous["seen_at"] = seen_at
+                heartbeats.append(
+                    {"source": quote.source, "currency": quote.currency, "seen_at": seen_at}
+                )
+            else:
+                rows.append(quote.to_row())
+                last[key] = _index_entry(quote)
+
+        if rows:
+            _append_csv(self.path, FIELDNAMES, rows)
+        if heartbeats:
+            _append_csv(self.heartbeat_path, HEARTBEAT_FIELDNAMES, heartbeats)
+        if rows or heartbeats:
+            self._save_index()
+
+        return {
+            "written": len(rows),
+            "heartbeats": len(heartbeats),
+            "duplicates": duplicates,
+            "rows": rows,
+        }
+
+    def load_history(self, quotes):
+        """Bulk-load historical quotes (backfills), bypassing change detection.
+
+        A quote is skipped when the store already has one for the same
+        source, currency and exchange date, so reloading a range is
+        harmless. The entries of the last-value index are left alone:
+        history never replaces the latest rate; only the file sizes it
+        records move. Returns the written CSV rows.
+        """
+        with _file_lock(self.lock_path):
+            self._last = None
+            # Validate the index against the files before they grow
+            self.last_values()
+            if self._history_keys is None:
+                self._history_keys = {
+                    (
+                        row["source"],
+                        row.get("currency") or DEFAULT_CURRENCY,
+                        row["exchange_date"][:10],
+                    )
+                    for row in _read_rows(self.path)
+                    if row.get("status") == "Success"
+                }
+            rows = []
+            for quote in quotes:
+                if not quote.ok:
+                    continue
+                row = quote.to_row()
+                key = (row["source"], row["currency"], row["exchange_date"])
+                if key not in self._history_keys:
+                    self._history_keys.add(key)
+                    rows.append(row)
+            if rows:
+                _append_csv(self.path, FIELDNAMES, rows)
+                self._save_index()
+        return rows
+
+    def locked(self):
+        """Context manager holding the store lock, for maintenance that
+        replaces the files (``append`` takes it on its own)"""
+        return _file_lock(self.lock_path)
+
+    def _save_index(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sizes": self._sizes(), "series": self._last}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def day_offsets(self):
+        """Sparse day index of the quotes CSV, brought up to date.
+
+        Returns ``{"days": {"YYYY-MM-DD": offset}, "ordered": bool, ...}``;
+        ``ordered`` is False once a row was appended for an earlier day than
+        the one before it (backfills), in which case readers cannot stop at
+        the end of a range.
+        """
+        try:
+            with open(self.days_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = None
+        if not os.path.isfile(self.path):
+            return {"days": {}, "ordered": True, "scanned": 0, "header": None}
+
+        with open(self.path, "rb") as f:
+            header = f.readline().decode("utf-8")
+            header_end = f.tell()
+            size = os.fstat(f.fileno()).st_size
+            # A rewritten file (schema upgrade, migration) is indexed again
+            if (
+                index is None
+                or index["header"] != header
+                or index["scanned"] > size
+                or not _line_start(f, index["scanned"])
+            ):
+                index = {"days": {}, "ordered": True, "scanned": header_end, "header": header}
+            if index["scanned"] == size:
+                return index
+            days = index["days"]
+            last_day = max(days) if days else ""
+            f.seek(index["scanned"])
+            position = index["scanned"]
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written row
+                day = line[:10].decode("ascii", "replace")
+                if day not in days:
+                    days[day] = position
+                if day < last_day:
+                    index["ordered"] = False
+                last_day = max(last_day, day)
+                position += len(line)
+            index["scanned"] = position
+
+        tmp_path = self.days_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, sort_keys=True)
+        os.replace(tmp_path, self.days_path)
+        return index
+
+    def success_quotes(self):
+        """Every successful quote of the CSV, skipping rows that do not parse"""
+        quotes = []
+        for row in _read_rows(self.path):
+            if row.get("status") != "Success":
+                continue
+            try:
+                quotes.append(Quote.from_row(row))
+            except (KeyError, ValueError, ArithmeticError):
+                continue
+        logging.info("Read %d quotes from %s", len(quotes), self.path)
+        return quotes
+
+    def collected_quotes(self):
+        """Every successful collection in time order, heartbeats included.
+
+        A heartbeat is expanded into the quote it confirmed, at the time it
+        was seen, so state built from the history weighs samples the same
+        as state folded from the quotes of each run.
+        """
+        quotes = self.success_quotes()
+        series = {}
+        for quote in sorted(quotes, key=lambda quote: quote.collection_time):
+            series.setdefault(series_key(quote.source, quote.currency), []).append(quote)
+        times = {key: [quote.collection_time for quote in rows] for key, rows in series.items()}
+
+        collected = list(quotes)
+        for beat in _read_rows(self.heartbeat_path):
+            key = series_key(beat["source"], beat.get("currency") or DEFAULT_CURRENCY)
+            if key not in series:
+                continue
+            try:
+                seen_at = datetime.strptime(beat["seen_at"], TIMESTAMP_FORMAT)
+            except (KeyError, ValueError):
+                continue
+            position = bisect.bisect_right(times[key], seen_at)
+            if position:
+                collected.append(series[key][position - 1]._replace(collection_time=seen_at))
+        collected.sort(key=lambda quote: quote.collection_time)
+        return collected
+
+    def iter_rows(self, start=None, end=None):
+        """Yield CSV rows collected between ``start`` and ``end`` (dates, inclusive).
+
+        Reading starts at the first indexed day in range and, while the file
+        is in time order, stops after the last one.
+        """
+        index = self.day_offsets()
+        first = start.isoformat() if start else ""
+        last = end.isoformat() if end else "9999-99-99"
+        offsets = [offset for day, offset in index["days"].items() if first <= day <= last]
+        if not offsets:
+            return
+        with open(self.path, newline="", encoding="utf-8") as f:
+            fieldnames = next(csv.reader(f))
+            f.seek(min(offsets))
+            for row in csv.DictReader(f, fieldnames=fieldnames):
+                day = row["collection_time"][:10]
+                if day > last and index["ordered"]:
+                    break
+                if first <= day <= last:
+                    yield row
+
+    def rate_at(self, source, when, currency=DEFAULT_CURRENCY):
+        """Return ``(quote, confirmed_until)`` for a series at time ``when``.
+
+        ``quote`` is None if nothing had been collected yet. ``confirmed_until``
+        is the last collection (change or heartbeat) that still saw that rate.
+        """
+        moment = when.strftime(TIMESTAMP_FORMAT)
+        rows = [
+            row
+            for row in _read_rows(self.path)
+            if row["source"] == source
+            and (row.get("currency") or DEFAULT_CURRENCY) == currency
+            and row["status"] == "Success"
+        ]
+        # Backfilled history is appended after newer rows
+        rows.sort(key=lambda row: row["collection_time"])
+        times = [row["collection_time"] for row in rows]
+        position = bisect.bisect_right(times, moment)
+        if position == 0:
+            return None, None
+
+        quote = Quote.from_row(rows[position - 1])
+        end = times[position] if position < len(times) else None
+        confirmed_until = times[position - 1]
+        for beat in _read_rows(self.heartbeat_path):
+            seen_at = beat["seen_at"]
+            if (
+                beat["source"] == source
+                and (beat.get("currency") or DEFAULT_CURRENCY) == currency
+                and seen_at > confirmed_until
+                and (end is None or seen_at < end)
+            ):
+                confirmed_until = seen_at
+        return quote, datetime.strptime(confirmed_until, TIMESTAMP_FORMAT)
+
+
+def _read_rows(path):
+    if not os.path.isfile(path):
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _line_start(f, offset):
+    """True when ``offset`` of the open binary file ``f`` is the start of a line"""
+    if offset <= 0:
+        return True
+    f.seek(offset - 1)
+    return f.read(1) == b"\n"
+
+
+def _index_entry(quote):
+    row = quote.to_row()
+    return {
+        "exchange_date": row["exchange_date"],
+        "buy_rate": row["buy_rate"],
+        "sell_rate": row["sell_rate"],
+        "collection_time": row["collection_time"],
+        "seen_at": row["collection_time"],
+    }
+
+
+def _unchanged(previous, quote):
+    """True when ``quote`` repeats the index entry ``previous`` (canonical text)"""
+    exchange_date = previous["exchange_date"]
+    return (
+        (parse_date(exchange_date) if exchange_date else None) == quote.exchange_date
+        and parse_stored_number(previous["buy_rate"]) == quote.buy_rate
+        and parse_stored_number(previous["sell_rate"]) == quote.sell_rate
+    )
+
+
+def _upgrade_schema(path, fieldnames):
+    """Rewrite a file whose header predates ``fieldnames``, defaulting to USD"""
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), None)
+    if header is None or header == fieldnames:
+        return
+    logging.info("Upgrading %s to columns %s", path, ", ".join(fieldnames))
+    tmp_path = path + ".tmp"
+    with open(path, newline="", encoding="utf-8") as src, open(
+        tmp_path, "w", newline="", encoding="utf-8"
+    ) as dst:
+        writer = csv.DictWriter(dst, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for row in csv.DictReader(src):
+            if not row.get("currency"):
+                row["currency"] = DEFAULT_CURRENCY
+            writer.writerow(row)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _file_lock(path):
+    """Hold an exclusive advisory lock on ``path`` (created if missing)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 s
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _repair_tail(path, fieldnames):
+    """Fix a final line left without its newline by a writer that died.
+
+    A complete row that only lacks the terminator is kept; a torn partial
+    row is cut off.
+    """
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        start = max(0, size - 64 * 1024)
+        f.seek(start)
+        tail = f.read()
+        cut = start + tail.rfind(b"\n") + 1
+        fragment = tail[cut - start :].decode("utf-8", "replace")
+        if len(next(csv.reader([fragment]), [])) == len(fieldnames):
+            f.write(b"\r\n")
+            return
+        logging.warning("Dropping torn last line of %s: %r", path, fragment)
+        f.truncate(cut)
+
+
+def _append_csv(path, fieldnames, rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        # Readers must never see a file without its header
+        writer.writeheader()
+        writer.writerows(rows)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue().encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return
+
+    _upgrade_schema(path, fieldnames)
+    _repair_tail(path, fieldnames)
+    writer.writerows(rows)
+    with open(path, "ab") as f:
+        f.write(buffer.getvalue().encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
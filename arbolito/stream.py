@@ -0,0 +1,238 @@
+"""Local change stream between the collector and its readers.
+
+Usage::
+
+    python -m arbolito.stream        # run the broker
+
+The broker listens on a Unix-domain socket and speaks newline-delimited
+JSON:
+
+* ``{"op": "publish", "batch": {...}}`` stores the batch under the next
+  sequence number, fans it out to subscribers and answers ``{"seq": n}``.
+* ``{"op": "subscribe", "after": n}`` replays every batch after sequence
+  ``n`` (flagged ``"replay": true``) and then streams new ones as
+  ``{"seq": m, "batch": {...}}``. When ``n`` is older than the retained
+  journal, or more than ``max_replay`` batches behind, the subscriber
+  first gets ``{"op": "reset", "seq": latest}`` and must reload from the
+  files.
+
+Batches are appended to a journal file, so sequence numbers survive broker
+restarts. Publishing is best effort: the collector never waits on or fails
+because of the stream, and a subscriber that stops reading is dropped once
+its unsent data passes ``max_buffer`` bytes (it resumes on reconnect).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+from collections import deque
+
+from arbolito.health import backoff_delay
+from arbolito.logs import setup_logging
+
+STREAM_SOCKET = os.path.join("data", "stream.sock")
+JOURNAL_PATH = os.path.join("data", "stream_journal.jsonl")
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+
+
+class Broker:
+    """Sequenced fan-out of batches, keeping the last ``keep`` in memory and on disk"""
+
+    def __init__(
+        self,
+        socket_path=STREAM_SOCKET,
+        journal_path=JOURNAL_PATH,
+        keep=1000,
+        max_replay=200,
+        max_buffer=4 * 1024 * 1024,
+    ):
+        self.socket_path = socket_path
+        self.journal_path = journal_path
+        self.keep = keep
+        self.max_replay = max_replay
+        self.max_buffer = max_buffer
+        self.seq = 0
+        self.journal = deque(maxlen=keep)
+        self.subscribers = set()
+        self._load_journal()
+
+    def _load_journal(self):
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line
+                    self.journal.append(entry)
+                    self.seq = max(self.seq, entry["seq"])
+        except FileNotFoundError:
+            pass
+        # Compact to the retained tail on every start
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for entry in self.journal:
+                f.write(_encode(entry))
+        os.replace(tmp_path, self.journal_path)
+        self._journal_file = open(self.journal_path, "ab")
+
+    def publish(self, batch):
+        self.seq += 1
+        entry = {"seq": self.seq, "batch": batch}
+        self.journal.append(entry)
+        data = _encode(entry)
+        self._journal_file.write(data)
+        self._journal_file.flush()
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                # Not reading: drop it rather than buffer without bound
+                logging.warning("Dropping a change stream subscriber that stopped reading")
+                self.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(data)
+        return self.seq
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if message.get("op") == "publish":
+                    seq = self.publish(message.get("batch", {}))
+                    writer.write(_encode({"seq": seq}))
+                    await writer.drain()
+                elif message.get("op") == "subscribe":
+                    await self._subscribe(int(message.get("after", 0)), writer)
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    async def _subscribe(self, after, writer):
+        oldest = self.journal[0]["seq"] if self.journal else self.seq + 1
+        if after < oldest - 1 or after > self.seq or self.seq - after > self.max_replay:
+            # The gap cannot be replayed (or the journal was reset), or is
+            # cheaper to reload from the files
+            writer.write(_encode({"op": "reset", "seq": self.seq}))
+            after = self.seq
+        for entry in self.journal:
+            if entry["seq"] > after:
+                writer.write(_encode(dict(entry, replay=True)))
+        self.subscribers.add(writer)
+        await writer.drain()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle, self.socket_path)
+        logging.info("Change stream listening on %s (seq %d)", self.socket_path, self.seq)
+        async with server:
+            await server.serve_forever()
+
+
+def publish(batch, socket_path=STREAM_SOCKET, timeout=0.5):
+    """Send ``batch`` to the broker; returns its sequence number or None"""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall(_encode({"op": "publish", "batch": batch}))
+            reply = client.makefile("rb").readline()
+        return json.loads(reply)["seq"]
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning("Could not publish to the change stream: %s", e)
+        return None
+
+
+class Subscriber:
+    """Follows the change stream, calling ``on_batch(batch, replay)`` for each batch.
+
+    ``replay`` is True for batches published before the subscription, which
+    the broker sends again on connect.
+
+    ``on_reset()`` is called when batches were missed and cannot be
+    replayed, so the reader should drop its in-memory state. The last
+    sequence seen is kept across reconnects, which resume from it.
+    """
+
+    def __init__(self, on_batch, on_reset=None, socket_path=STREAM_SOCKET, seq=0):
+        self.on_batch = on_batch
+        self.on_reset = on_reset
+        self.socket_path = socket_path
+        self.seq = seq
+
+    async def run(self):
+        attempt = 0
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    self.socket_path, limit=2**22
+                )
+            except OSError:
+                await asyncio.sleep(backoff_delay(attempt, base=1.0, cap=30.0))
+                attempt += 1
+                continue
+            try:
+                writer.write(_encode({"op": "subscribe", "after": self.seq}))
+                await writer.drain()
+                while line := await reader.readline():
+                    attempt = 0
+                    self._dispatch(json.loads(line))
+                logging.warning("Change stream closed by the broker")
+            except (OSError, ValueError) as e:
+                logging.warning("Change stream disconnected: %s", e)
+            finally:
+                writer.close()
+            # Also after a clean close, or a restarting broker spins this loop
+            await asyncio.sleep(backoff_delay(attempt, base=1.0, cap=30.0))
+            attempt += 1
+
+    def _dispatch(self, message):
+        if message.get("op") == "reset":
+            self.seq = message["seq"]
+            if self.on_reset is not None:
+                self.on_reset()
+            return
+        if message["seq"] <= self.seq:
+            return
+        self.seq = message["seq"]
+        try:
+            self.on_batch(message["batch"], message.get("replay", False))
+        except Exception:
+            logging.exception("Failed to apply change stream batch %d", self.seq)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local change stream broker")
+    parser.add_argument("--socket", default=STREAM_SOCKET)
+    parser.add_argument("--journal", default=JOURNAL_PATH)
+    parser.add_argument(
+        "--max-replay",
+        type=int,
+        default=200,
+        help="batches replayed to a subscriber before it is told to reload (default: 200)",
+    )
+    args = parser.parse_args(argv)
+
+    setup_logging("log/stream_log.log")
+    asyncio.run(Broker(args.socket, args.journal, max_replay=args.max_replay).serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,5 @@
 import os
 import logging
-import pandas as pd
-import io
-import asyncio
 import nest_asyncio
 from telegram import Update
 from telegram.ext import (
@@ -11,17 +8,36 @@ from telegram.ext import (
     MessageHandler,
     filters,
     ConversationHandler,
+    InlineQueryHandler,
 )
 
 from dotenv import load_dotenv
 
+from arbolito.commands import (
+    estado,
+    exportar,
+    follow_changes,
+    grafico,
+    historial,
+    inline_quotes,
+    itinerario,
+    mejor,
+    promedio,
+    volatilidad,
+)
+from arbolito.data import load_quotes
+from arbolito.logs import setup_logging
+from arbolito.quote import DEFAULT_CURRENCY, parse_currency
+from arbolito.replies import cached_reply
+
 # Load the environment variables from the .env file
 load_dotenv()
 bot_token = os.environ.get("TOKEN_TELEGRAM_ARBOLITO")
 
 # Set up logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+setup_logging(
+    log_file=None,
+    console_format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
 
@@ -33,72 +49,45 @@ CHOOSING = 0
 async def start(update: Update, context):
     await update.message.reply_text(
         "Bienvenido al bot de cotizaciones de bancos. "
-        "Por favor, elija un banco (BNA, PROVINCIA, CIUDAD, BBVA) o escriba 'TODOS' para obtener todas las cotizaciones."
+        "Por favor, elija un banco (BNA, PROVINCIA, CIUDAD, BBVA) o escriba 'TODOS' para obtener todas las cotizaciones.\n\n"
+        "Para otra moneda agréguela al banco, por ejemplo 'BNA EUR' o 'TODOS REAL'.\n"
+        "Para ver la evolución use /historial BNA 30d o /grafico BNA 90d.\n"
+        "Para promedios y volatilidad recientes use /promedio BNA 7d o /volatilidad BNA 30d.\n"
+        "Para saber dónde conviene comprar o vender use /mejor.\n"
+        "Para ver si algún banco no se está actualizando use /estado.\n"
+        "Para descargar el historial use /exportar BNA 2025-01-01 2025-03-31."
     )
 
 
 async def process_bank(update: Update, context):
-    bank = update.message.text.upper()
+    # "BNA EUR": las palabras que son monedas eligen la moneda, el resto el banco
+    words = update.message.text.upper().split()
+    currencies = [parse_currency(word) for word in words]
+    currency = next((code for code in currencies if code), DEFAULT_CURRENCY)
+    bank = " ".join(word for word, code in zip(words, currencies) if code is None)
 
-    csv_path = os.path.join("data", "exchange_rates_v2.csv")
-    logging.info(f"Buscando cotización para el banco: {bank}...")
+    logging.info("Buscando cotización para el banco: %s...", bank)
 
     if bank == "" or bank == "START":
         await start(update, context)
         return ConversationHandler.END
 
-    if not os.path.exists(csv_path):
+    quotes = load_quotes()
+    if quotes is None:
         await update.message.reply_text(
             "Error: No se encontró el archivo de cotizaciones... Verifique proceso 'run_exchange_rates.py'..."
         )
         return ConversationHandler.END
 
-    df = pd.read_csv(csv_path)
-
-    if bank != "TODOS":
-        df = df[df["source"].str.upper().str.contains(bank)]
-
-        if df.empty:
-            await update.message.reply_text(
-                f"No se encontraron cotizaciones para {bank}...\n\n"
-                "Por favor, elija un banco (BNA, PROVINCIA, CIUDAD, BBVA) o escriba 'TODOS'."
-            )
-            return ConversationHandler.END
-
-        last_row = df.tail(1).iloc[0]
-        banco = last_row["source"]
-        compra = last_row["buy_rate"]
-        venta = last_row["sell_rate"]
-        fecha = last_row["exchange_date"]
-        hora = last_row["collection_time"].split()[1]
-
+    # Rendered once per data version, see arbolito.replies
+    mensaje = cached_reply(quotes, "ultima", bank, currency)
+    if mensaje is None:
+        moneda = "" if currency == DEFAULT_CURRENCY else f" ({currency})"
         mensaje = (
-            f"📅 Cotización del {banco} al {fecha} {hora}:\n"
-            f"🔸 Compra: ${compra}\n"
-            f"🔹 Venta: ${venta}"
+            f"No se encontraron cotizaciones para {bank}{moneda}...\n\n"
+            "Por favor, elija un banco (BNA, PROVINCIA, CIUDAD, BBVA) o escriba 'TODOS'."
         )
 
-    else:
-        # Agrupar por banco y tomar la última cotización de cada uno
-        df["collection_time"] = pd.to_datetime(df["collection_time"])
-        ultimas = df.sort_values("collection_time").groupby("source").tail(1)
-
-        mensajes = []
-        for _, row in ultimas.iterrows():
-            banco = row["source"]
-            compra = row["buy_rate"]
-            venta = row["sell_rate"]
-            fecha = row["exchange_date"]
-            hora = row["collection_time"].strftime("%H:%M:%S")
-
-            mensajes.append(
-                f"🏦 {banco} ({fecha} {hora})\n"
-                f"🔸 Compra: ${compra}\n"
-                f"🔹 Venta: ${venta}"
-            )
-
-        mensaje = "\n\n".join(mensajes)
-
     await update.message.reply_text(mensaje)
 
     return ConversationHandler.END
@@ -106,11 +95,21 @@ async def process_bank(update: Update, context):
 
 def main():
     # Replace 'YOUR_BOT_TOKEN' with your actual bot token
-    application = Application.builder().token(bot_token).build()
+    application = Application.builder().token(bot_token).post_init(follow_changes).build()
 
     # Add handler for /start command
     start_handler = CommandHandler("start", start)
     application.add_handler(start_handler)
+    application.add_handler(CommandHandler("historial", historial))
+    application.add_handler(CommandHandler("grafico", grafico))
+    application.add_handler(CommandHandler("mejor", mejor))
+    application.add_handler(CommandHandler("exportar", exportar))
+    application.add_handler(CommandHandler("itinerario", itinerario))
+    application.add_handler(CommandHandler("promedio", promedio))
+    application.add_handler(CommandHandler("volatilidad", volatilidad))
+    application.add_handler(CommandHandler("estado", estado))
+    # "@bot bna" from any chat; inline mode must be enabled with BotFather
+    application.add_handler(InlineQueryHandler(inline_quotes))
 
     # Add handler for message processing
     conv_handler = ConversationHandler(
@@ -1,8 +1,5 @@
 import os
 import logging
-import pandas as pd
-import io
-import asyncio
 import nest_asyncio
 from telegram import Update
 from telegram.ext import (
@@ -11,17 +8,36 @@ from telegram.ext import (
     MessageHandler,
     filters,
     ConversationHandler,
+    InlineQueryHandler,
 )
 
 from dotenv import load_dotenv
 
+from arbolito.commands import (
+    estado,
+    exportar,
+    follow_changes,
+    grafico,
+    historial,
+    inline_quotes,
+    itinerario,
+    mejor,
+    promedio,
+    volatilidad,
+)
+from arbolito.data import load_quotes
+from arbolito.logs import setup_logging
+from arbolito.quote import DEFAULT_CURRENCY, parse_currency
+from arbolito.replies import COMMON_BANKS, cached_reply
+
 # Load the environment variables from the .env file
 load_dotenv()
 bot_token = os.environ.get("TOKEN_TELEGRAM_ARBOLITO")
 
 # Set up logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+setup_logging(
+    log_file=None,
+    console_format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
 
@@ -34,6 +50,12 @@ async def start(update: Update, context):
     await update.message.reply_text(
         "Bienvenido al bot de cotizaciones de bancos.\n\n"
         "Por favor, elija un banco (BNA, PROVINCIA, CIUDAD, BBVA) o escriba 'TODOS' para obtener todas las cotizaciones, seguido de la fecha en formato 'yyyy-mm-dd'.\n\nPor ejemplo, bna 2025-04-25.\n"
+        "Para otra moneda agréguela, por ejemplo bna eur 2025-04-25.\n"
+        "Para ver la evolución use /historial BNA 30d o /grafico BNA 90d.\n"
+        "Para promedios y volatilidad recientes use /promedio BNA 7d o /volatilidad BNA 30d.\n"
+        "Para saber dónde conviene comprar o vender use /mejor.\n"
+        "Para ver si algún banco no se está actualizando use /estado.\n"
+        "Para descargar el historial use /exportar BNA 2025-01-01 2025-03-31.\n"
     )
 
 
@@ -44,26 +66,25 @@ async def process_bank(update: Update, context):
     user_input = update.message.text.strip().upper()
     parts = user_input.split()
 
-    csv_path = os.path.join("data", "exchange_rates_v2.csv")
-    logging.info(f"Mensaje recibido: {user_input}")
+    logging.info("Mensaje recibido: %s", user_input)
 
-    if not os.path.exists(csv_path):
+    quotes = load_quotes()
+    if quotes is None:
         await update.message.reply_text(
             "Error: No se encontró el archivo de cotizaciones... Verifique proceso 'run_exchange_rates.py'..."
         )
         return ConversationHandler.END
 
-    df = pd.read_csv(csv_path)
-    df["collection_time"] = pd.to_datetime(df["collection_time"])
-    df["exchange_date"] = pd.to_datetime(df["exchange_date"]).dt.date
-
     # --- Analizar input del usuario ---
     bank = None
     fecha = None
+    currency = DEFAULT_CURRENCY
 
     for part in parts:
-        if part in ["BNA", "PROVINCIA", "CIUDAD", "BBVA", "TODOS"]:
+        if part in COMMON_BANKS:
             bank = part
+        elif parse_currency(part):
+            currency = parse_currency(part)
         else:
             try:
                 fecha = datetime.strptime(part, "%Y-%m-%d").date()
@@ -75,46 +96,10 @@ async def process_bank(update: Update, context):
         await start(update, context)
         return ConversationHandler.END
 
-    # Aplicar filtros
-    if fecha:
-        df = df[df["exchange_date"] == fecha]
-    if bank and bank != "TODOS":
-        df = df[df["source"].str.upper().str.contains(bank)]
-
-    if df.empty:
-        await update.message.reply_text(
-            "No se encontraron cotizaciones para ese criterio."
-        )
-        return ConversationHandler.END
-
-    if bank != "TODOS":
-        last_row = df.sort_values("collection_time").tail(1).iloc[0]
-        banco = last_row["source"]
-        compra = last_row["buy_rate"]
-        venta = last_row["sell_rate"]
-        fecha_str = last_row["exchange_date"]
-        hora = last_row["collection_time"].strftime("%H:%M:%S")
-
-        mensaje = (
-            f"📅 Cotización del {banco} al {fecha_str}:\n"
-            f"🔸 Compra: ${compra}\n"
-            f"🔹 Venta: ${venta}"
-        )
-    else:
-        ultimas = df.sort_values("collection_time").groupby("source").tail(1)
-        mensajes = []
-        for _, row in ultimas.iterrows():
-            banco = row["source"]
-            compra = row["buy_rate"]
-            venta = row["sell_rate"]
-            fecha_str = row["exchange_date"]
-            hora = row["collection_time"].strftime("%H:%M:%S")
-            mensajes.append(
-                f"🏦 {banco} ({fecha_str})\n"
-                f"🔸 Compra: ${compra}\n"
-                f"🔹 Venta: ${venta}"
-            )
-        mensaje = "\n\n".join(mensajes)
+    # Rendered once per data version, see arbolito.replies
+    mensaje = cached_reply(quotes, "fecha", bank, currency, fecha)
+    if mensaje is None:
+        mensaje = "No se encontraron cotizaciones para ese criterio."
 
     await update.message.reply_text(mensaje)
     return ConversationHandler.END
@@ -122,11 +107,21 @@ async def process_bank(update: Update, context):
 
 def main():
     # Replace 'YOUR_BOT_TOKEN' with your actual bot token
-    application = Application.builder().token(bot_token).build()
+    application = Application.builder().token(bot_token).post_init(follow_changes).build()
 
     # Add handler for /start command
     start_handler = CommandHandler("start", start)
     application.add_handler(start_handler)
+    application.add_handler(CommandHandler("historial", historial))
+    application.add_handler(CommandHandler("grafico", grafico))
+    application.add_handler(CommandHandler("mejor", mejor))
+    application.add_handler(CommandHandler("exportar", exportar))
+    application.add_handler(CommandHandler("itinerario", itinerario))
+    application.add_handler(CommandHandler("promedio", promedio))
+    application.add_handler(CommandHandler("volatilidad", volatilidad))
+    application.add_handler(CommandHandler("estado", estado))
+    # "@bot bna" from any chat; inline mode must be enabled with BotFather
+    application.add_handler(InlineQueryHandler(inline_quotes))
 
     # Add handler for message processing
     conv_handler = ConversationHandler(
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from arbolito.api import QuoteAPI
+
+QUOTES = (
+    "collection_time,exchange_date,buy_rate,sell_rate,source,currency,status\n"
+    "2025-05-01 10:00:00,2025-05-01,1100,1150,BNA,USD,Success\n"
+    "2025-05-02 10:00:00,2025-05-02,1110,1160,BNA,USD,Success\n"
+    "2025-05-03 10:00:00,2025-05-03,1120,1170,BNA,USD,Success\n"
+)
+
+
+async def _exchange(path, raw, responses):
+    """Send ``raw`` on one connection and read ``responses`` (status, body) pairs"""
+    server = await asyncio.start_server(QuoteAPI(path).handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    results = []
+    for _ in range(responses):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        length = next(
+            int(line.split(":", 1)[1]) for line in head if line.lower().startswith("content-length")
+        )
+        results.append((int(head[0].split()[1]), json.loads(await reader.readexactly(length))))
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return results
+
+
+def _get(target):
+    return f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+
+
+def test_history_dates_are_validated(tmp_path):
+    path = tmp_path / "quotes.csv"
+    path.write_text(QUOTES, encoding="utf-8")
+    raw = (
+        _get("/history?source=bna&from=2025-05-02&to=02/05/2025")
+        + _get("/history?source=bna&from=2025-13-01")
+        + _get("/history?source=bna&to=mañana")
+    )
+
+    (ok, day), (bad_month, _), (bad_text, _) = asyncio.run(_exchange(str(path), raw, 3))
+
+    assert ok == 200 and [record["sell_rate"] for record in day] == [1160.0]
+    assert (bad_month, bad_text) == (400, 400)
+
+
+def test_request_body_does_not_leak_into_the_next_request(tmp_path):
+    path = tmp_path / "quotes.csv"
+    path.write_text(QUOTES, encoding="utf-8")
+    body = b"GET /latest/nada HTTP/1.1\r\n\r\n"
+    raw = (
+        b"POST /latest HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body)
+        + body
+        + _get("/history?source=bna&from=2025-05-03")
+    )
+
+    (posted, _), (status, records) = asyncio.run(_exchange(str(path), raw, 2))
+
+    assert posted == 405
+    assert status == 200 and [record["sell_rate"] for record in records] == [1170.0]
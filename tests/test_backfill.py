@@ -0,0 +1,92 @@
+import threading
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from arbolito.backfill import Backfill, parse_bna_history
+from arbolito.quote import Quote
+from arbolito.rollups import DAY, Rollups, load_rollups
+from arbolito.store import QuoteStore
+
+PAGE = """<table><tr><th>Moneda</th><th>Compra</th><th>Venta</th><th>Fecha</th></tr>
+<tr><td>Dolar U.S.A</td><td>{buy}</td><td>{sell}</td><td>{day}</td></tr></table>"""
+
+
+class _HistoryHandler(BaseHTTPRequestHandler):
+    """Serves one USD row per day: buy is 900 + day of month"""
+
+    requests = []
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        day = datetime.strptime(parse_qs(url.query)["fecha"][0], "%d/%m/%Y")
+        self.requests.append(day.date())
+        body = PAGE.format(
+            buy=f"{900 + day.day},00", sell=f"{950 + day.day},00", day=f"{day:%d/%m/%Y}"
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _HistoryHandler)
+    _HistoryHandler.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", _HistoryHandler.requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_bna_history():
+    quotes = parse_bna_history(PAGE.format(buy="1.140,00", sell="1.180,50", day="02/05/2025"))
+
+    assert [(q.currency, str(q.buy_rate), str(q.sell_rate), q.exchange_date) for q in quotes] == [
+        ("USD", "1140.00", "1180.50", date(2025, 5, 2))
+    ]
+
+
+def test_backfill_against_fixture_server_resumes_from_checkpoint(tmp_path, fixture_server):
+    pytest.importorskip("requests")
+    base_url, served = fixture_server
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+
+    backfill = Backfill("bna", base_url, store, workers=2, rate=100)
+    assert backfill.run(date(2025, 5, 1), date(2025, 5, 6), chunk_days=2) == 6
+    assert sorted(served) == [date(2025, 5, day) for day in range(1, 7)]
+
+    served.clear()
+    again = Backfill("bna", base_url, QuoteStore(store.path), workers=2, rate=100)
+    assert again.run(date(2025, 5, 1), date(2025, 5, 8), chunk_days=2) == 2
+    # Only the chunk not recorded in the checkpoint is fetched
+    assert sorted(served) == [date(2025, 5, 7), date(2025, 5, 8)]
+
+    quote, _ = store.rate_at("BNA", datetime(2025, 5, 3, 12))
+    assert str(quote.buy_rate) == "903.00"
+
+
+def test_backfilled_days_show_up_in_the_rollups(tmp_path, fixture_server):
+    pytest.importorskip("requests")
+    base_url, _ = fixture_server
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    backfill = Backfill("bna", base_url, store, workers=2, rate=100)
+    # The collector already folded a June quote, moving the watermark past May
+    collected = datetime(2025, 6, 2, 10)
+    store.append([Quote.success("BNA", 1100, 1150, collected.date(), collected)])
+    Rollups(backfill.rollups_path, store.path).save()
+    assert sorted(load_rollups(backfill.rollups_path).tiers[DAY]["BNA|USD"]) == ["2025-06-02"]
+
+    backfill.run(date(2025, 5, 1), date(2025, 5, 4), chunk_days=2)
+
+    days = load_rollups(backfill.rollups_path).tiers[DAY]["BNA|USD"]
+    assert sorted(days) == ["2025-05-01", "2025-05-02", "2025-05-03", "2025-05-04", "2025-06-02"]
+    assert days["2025-05-03"]["close"] == 953.0
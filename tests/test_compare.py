@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from arbolito.compare import build_comparison  # noqa: E402
+
+
+def _entry(buy, sell, seen_at):
+    return {
+        "exchange_date": seen_at[:10],
+        "buy_rate": buy,
+        "sell_rate": sell,
+        "collection_time": seen_at,
+        "seen_at": seen_at,
+    }
+
+
+def test_stale_bank_is_flagged_and_never_the_best():
+    last_values = {
+        "BNA|USD": _entry("1100", "1150", "2025-05-02 12:00:00"),
+        "BBVA|USD": _entry("1110", "1145", "2025-05-02 11:45:00"),
+        # Scraper down since the morning, with the most attractive rates
+        "Ciudad|USD": _entry("1200", "1100", "2025-05-02 06:00:00"),
+    }
+
+    comparison = build_comparison(last_values, now=datetime(2025, 5, 2, 12, 5))
+    usd = comparison["currencies"]["USD"]
+
+    assert usd["best_buy"] == {"source": "BBVA", "rate": 1145.0}
+    assert usd["best_sell"] == {"source": "BBVA", "rate": 1110.0}
+    assert usd["banks"]["Ciudad"]["stale"] is True
+    assert usd["banks"]["Ciudad"]["sell"] == 1100.0
+    assert not usd["banks"]["BNA"]["stale"]
@@ -0,0 +1,36 @@
+from arbolito.data import QuoteTable
+
+CSV = """collection_time,exchange_date,buy_rate,sell_rate,source,currency,status
+2025-04-24 10:00:00,24/4/2025,"1.140,00","1.180,00",BNA,USD,Success
+2025-04-25 10:00:00,2025-04-25,1150.125,1190.5,BNA,USD,Success
+2025-04-25 10:05:00,2025-04-25,not a rate,1190.5,BBVA,USD,Success
+2025-04-25 10:06:00,2025-04-25
+2025-04-25 11:00:00,2025-04-25,1160,1200,BBVA,USD,Success
+"""
+
+
+def test_read_csv_parses_legacy_rates_and_skips_malformed_rows(tmp_path):
+    path = tmp_path / "quotes.csv"
+    path.write_text(CSV, encoding="utf-8")
+
+    table = QuoteTable.read_csv(str(path))
+
+    assert len(table) == 3
+    assert [row.buy_rate for row in table.history(("BNA", "USD"))] == [1140.0, 1150.125]
+    assert [row.sell_rate for row in table.latest("USD", "BBVA")] == [1200.0]
+
+
+def test_append_rows_skips_malformed_rows():
+    table = QuoteTable()
+    row = {
+        "collection_time": "2025-04-25 10:00:00",
+        "exchange_date": "2025-04-25",
+        "buy_rate": "1150",
+        "sell_rate": "1190",
+        "source": "BNA",
+        "currency": "USD",
+        "status": "Success",
+    }
+
+    assert table.append_rows([dict(row, sell_rate="oops"), row]) == 1
+    assert len(table.buy_rates) == len(table.sell_rates) == len(table.statuses) == 1
@@ -0,0 +1,64 @@
+import os
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from arbolito.export import map_day, read_quotes, update_export  # noqa: E402
+
+HEADER = "collection_time,exchange_date,buy_rate,sell_rate,source,currency,status\n"
+ROWS = (
+    '2025-04-24 10:00:00,24/4/2025,"1.140,00","1.180,00",BNA,USD,Success\n'
+    "2025-04-24 10:00:00,2025-04-24,1150,1190.5,BBVA,USD,Success\n"
+    "2025-04-25 10:00:00,2025-04-25,210.125,215.125,BNA,BRL,Success\n"
+)
+
+
+def _export(tmp_path, text):
+    path = tmp_path / "quotes.csv"
+    path.write_text(text, encoding="utf-8")
+    return str(path), str(tmp_path / "columnar")
+
+
+def _sells(export_dir, **filters):
+    table = read_quotes(export_dir=export_dir, **filters).sort_by("collection_time")
+    return list(zip(table.column("source").to_pylist(), table.column("sell_rate").to_pylist()))
+
+
+def test_export_reads_legacy_and_canonical_rates(tmp_path):
+    path, export_dir = _export(tmp_path, HEADER + ROWS)
+
+    assert update_export(path, export_dir) == 3
+    assert sorted(_sells(export_dir)) == [("BBVA", 1190.5), ("BNA", 215.125), ("BNA", 1180.0)]
+    assert _sells(export_dir, sources=["BNA"], start=date(2025, 4, 25)) == [("BNA", 215.125)]
+    assert map_day(date(2025, 4, 24), export_dir).num_rows == 2
+
+
+def test_export_is_incremental_and_skips_rows_already_exported(tmp_path):
+    path, export_dir = _export(tmp_path, HEADER + ROWS)
+    update_export(path, export_dir)
+    state_path = os.path.join(export_dir, "state.json")
+    with open(state_path, encoding="utf-8") as f:
+        checkpoint = f.read()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("2025-04-25 11:00:00,2025-04-25,1160,1200,BNA,USD,Success\n")
+
+    assert update_export(path, export_dir) == 1
+    # A crash before the checkpoint was saved replays the same lines
+    with open(state_path, "w", encoding="utf-8") as f:
+        f.write(checkpoint)
+    assert update_export(path, export_dir) == 0
+    assert read_quotes(export_dir=export_dir).num_rows == 4
+
+
+def test_export_rebuilds_when_the_file_is_replaced(tmp_path):
+    path, export_dir = _export(tmp_path, HEADER + ROWS)
+    update_export(path, export_dir)
+    # Same header, same size: only the identity tells the files apart
+    replacement = tmp_path / "migrated.csv"
+    replacement.write_text(HEADER + ROWS.replace("1190.5", "1190.7"), encoding="utf-8")
+    os.replace(replacement, path)
+
+    assert update_export(path, export_dir) == 3
+    assert sorted(_sells(export_dir))[0] == ("BBVA", 1190.7)
@@ -0,0 +1,33 @@
+import multiprocessing
+
+import pytest
+
+from arbolito.governor import BrowserGovernor
+from arbolito.health import Deadline
+
+
+def _hold_slot(slots_dir, held, release):
+    with BrowserGovernor(slots=1, slots_dir=slots_dir).session("BNA"):
+        held.set()
+        release.wait(10)
+
+
+def test_browser_slots_are_shared_between_processes(tmp_path):
+    slots_dir = str(tmp_path / "slots")
+    held, release = multiprocessing.Event(), multiprocessing.Event()
+    other = multiprocessing.Process(target=_hold_slot, args=(slots_dir, held, release))
+    other.start()
+    try:
+        assert held.wait(10)
+        governor = BrowserGovernor(slots=1, slots_dir=slots_dir)
+        with pytest.raises(TimeoutError):
+            with governor.session("Provincia", Deadline(0.3)):
+                pass
+        with BrowserGovernor(slots=2, slots_dir=slots_dir).session("Provincia", Deadline(0.3)):
+            pass
+    finally:
+        release.set()
+        other.join(10)
+
+    with governor.session("Provincia", Deadline(1)):
+        pass
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from arbolito.migrate import cutover, migrate  # noqa: E402
+
+LEGACY = (
+    "collection_time,exchange_date,buy_rate,sell_rate,source,status\n"
+    '2025-04-24 10:00:00,24/4/2025,"1.140,00","1.180,00",BNA,Success\n'
+    "bad,line,with,far,too,many,fields,here\n"
+    "2025-04-24 11:00:00,2025-04-24,1150,1190.5,BBVA,Success\n"
+)
+LIVE = (
+    "collection_time,exchange_date,buy_rate,sell_rate,source,currency,status\n"
+    "2025-04-25 10:00:00,2025-04-25,210.125,215.125,BNA,BRL,Success\n"
+)
+
+
+def _rows(path):
+    return path.read_text(encoding="utf-8").splitlines()[1:]
+
+
+def test_migrate_resumes_at_the_byte_offset_despite_bad_lines(tmp_path):
+    legacy, output = tmp_path / "legacy.csv", tmp_path / "out.csv"
+    legacy.write_text(LEGACY, encoding="utf-8")
+
+    summary = migrate([str(legacy)], str(output), chunksize=1)
+    with legacy.open("a", encoding="utf-8") as f:
+        f.write("2025-04-24 12:00:00,2025-04-24,1151,1191,BBVA,Success\n2025-04-24 13:")
+    resumed = migrate([str(legacy)], str(output), chunksize=1)
+
+    assert (summary["rows_written"], summary["bad_lines"]) == (2, 1)
+    assert resumed["rows_written"] == 1
+    assert _rows(output) == [
+        "2025-04-24 10:00:00,2025-04-24,1140.00,1180.00,BNA,USD,Success",
+        "2025-04-24 11:00:00,2025-04-24,1150.00,1190.50,BBVA,USD,Success",
+        "2025-04-24 12:00:00,2025-04-24,1151.00,1191.00,BBVA,USD,Success",
+    ]
+
+
+def test_cutover_keeps_three_decimal_rates_and_late_rows(tmp_path):
+    live, output = tmp_path / "quotes.csv", tmp_path / "out.csv"
+    live.write_text(LIVE, encoding="utf-8")
+    migrate([str(live)], str(output))
+    with live.open("a", encoding="utf-8") as f:
+        f.write("2025-04-26 10:00:00,2025-04-26,1170,1210,BNA,USD,Success\n")
+
+    export_state = tmp_path / "columnar" / "state.json"
+    export_state.parent.mkdir()
+    export_state.write_text('{"offset": 10}', encoding="utf-8")
+
+    cutover(str(output), str(live), export_dir=str(tmp_path / "columnar"))
+
+    assert not output.exists()
+    assert not export_state.exists()
+    assert _rows(live) == [
+        "2025-04-25 10:00:00,2025-04-25,210.125,215.125,BNA,BRL,Success",
+        "2025-04-26 10:00:00,2025-04-26,1170.00,1210.00,BNA,USD,Success",
+    ]
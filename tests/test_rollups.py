@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from arbolito.quote import Quote
+from arbolito.rollups import DAY, Rollups
+from arbolito.store import QuoteStore
+
+
+def _run(hour, sell):
+    collected = datetime(2025, 5, 2, hour)
+    return [Quote.success("BNA", sell - 50, sell, collected.date(), collected)]
+
+
+def test_initial_build_counts_heartbeats_like_incremental_updates(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    incremental = Rollups(str(tmp_path / "incremental.json"), store.path)
+    for hour, sell in ((10, 1200), (11, 1200), (12, 1200), (13, 1260)):
+        quotes = _run(hour, sell)
+        store.append(quotes)
+        incremental.update(quotes)
+
+    rebuilt = Rollups(str(tmp_path / "rebuilt.json"), store.path)
+
+    assert rebuilt.tiers[DAY] == incremental.tiers[DAY]
+    assert rebuilt.tiers[DAY]["BNA|USD"]["2025-05-02"]["count"] == 4
@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from arbolito import sources
+from arbolito.sources import (
+    ADAPTERS,
+    HTML,
+    PLAYWRIGHT,
+    SELENIUM,
+    SourceRunner,
+    StrategyStats,
+    extract_bna,
+)
+
+BNA_PAGE = """<div><span class="fechaCot">18/10/2026</span></div>
+<div id="billetes"><table>
+<thead><tr><th>Moneda</th><th>Compra</th><th>Venta</th></tr></thead>
+<tbody>
+<tr><td class="tit">Dolar U.S.A</td><td>1.400,00</td><td>1.450,00</td></tr>
+<tr><td class="tit">Euro</td><td>1.600,00</td><td>1.700,00</td></tr>
+<tr><td class="tit">Real *</td><td>23.500,00</td><td>25.500,00</td></tr>
+</tbody></table></div>
+<div id="divisas"><table><tr><td>Dolar U.S.A</td><td>1</td><td>2</td></tr></table></div>"""
+
+
+def test_extract_bna_brings_the_real_to_one_unit():
+    rates = {currency: (buy, sell, day) for currency, buy, sell, day in extract_bna(BNA_PAGE)}
+
+    assert sorted(rates) == ["BRL", "EUR", "USD"]
+    assert rates["USD"] == ("1.400,00", "1.450,00", "18/10/2026")
+    assert rates["BRL"][:2] == (Decimal("235"), Decimal("255"))
+
+
+def _runner(tmp_path, monkeypatch, fetchers):
+    monkeypatch.setattr(sources, "kind_available", lambda kind: True)
+    for kind, fetch in fetchers.items():
+        monkeypatch.setitem(sources.FETCHERS, kind, fetch)
+    return SourceRunner(StrategyStats(str(tmp_path / "stats.json")))
+
+
+def _broken(calls, kind):
+    def fetch(strategy, timeout, browser):
+        calls.append(kind)
+        raise Exception(f"{kind} down")
+
+    return fetch
+
+
+def test_fetch_falls_back_to_the_next_strategy(tmp_path, monkeypatch):
+    calls = []
+    runner = _runner(
+        tmp_path,
+        monkeypatch,
+        {
+            HTML: _broken(calls, HTML),
+            PLAYWRIGHT: _broken(calls, PLAYWRIGHT),
+            SELENIUM: lambda strategy, timeout, browser: BNA_PAGE,
+        },
+    )
+
+    quotes = runner.fetch(ADAPTERS["bna"])
+
+    assert calls == [HTML, PLAYWRIGHT]
+    assert [quote.currency for quote in quotes] == ["USD", "EUR", "BRL"]
+    assert runner.backend("BNA") == "selenium/chrome"
+
+
+def test_probe_only_tries_the_cheapest_strategy(tmp_path, monkeypatch):
+    calls = []
+    runner = _runner(
+        tmp_path,
+        monkeypatch,
+        {kind: _broken(calls, kind) for kind in (HTML, PLAYWRIGHT, SELENIUM)},
+    )
+
+    quotes = runner.fetch(ADAPTERS["bna"], probe=True)
+
+    assert calls == [HTML]
+    assert not quotes[0].ok and "html down" in quotes[0].status
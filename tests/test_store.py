@@ -0,0 +1,181 @@
+import csv
+import logging
+import multiprocessing
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from arbolito.quote import Quote
+from arbolito.store import QuoteStore
+
+
+def _quote(buy, sell, when, source="BNA", currency="USD"):
+    return Quote.success(source, buy, sell, when[:10], datetime.fromisoformat(when), currency)
+
+
+def test_three_decimal_rates_become_heartbeats(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(210.125, 215.125, "2025-05-02 10:00:00", currency="BRL")])
+
+    result = QuoteStore(store.path).append(
+        [_quote(210.125, 215.125, "2025-05-02 11:00:00", currency="BRL")]
+    )
+
+    assert (result["written"], result["heartbeats"]) == (0, 1)
+
+
+def test_rebuilt_index_keeps_three_decimal_rates(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(210.125, 215.125, "2025-05-02 10:00:00", currency="BRL")])
+    os.remove(store.index_path)
+
+    entry = QuoteStore(store.path).last_values()["BNA|BRL"]
+
+    assert Decimal(entry["buy_rate"]) == Decimal("210.125")
+    assert Decimal(entry["sell_rate"]) == Decimal("215.125")
+
+
+def test_rate_at_with_history_backfilled_after_newer_rows(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(1100, 1150, "2025-05-10 10:00:00")])
+    store.append([_quote(1120, 1170, "2025-05-12 10:00:00")])
+    store.load_history(
+        [_quote(900, 950, "2025-05-01 00:00:00"), _quote(910, 960, "2025-05-02 00:00:00")]
+    )
+
+    assert store.rate_at("BNA", datetime(2025, 5, 11))[0].sell_rate == Decimal("1150")
+    assert store.rate_at("BNA", datetime(2025, 5, 13))[0].sell_rate == Decimal("1170")
+    assert store.rate_at("BNA", datetime(2025, 5, 1, 12))[0].sell_rate == Decimal("950")
+    assert store.rate_at("BNA", datetime(2025, 4, 30)) == (None, None)
+
+
+def _csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_append_stores_changes_heartbeats_and_rejects_replays(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+
+    first = store.append([_quote(1100, 1150, "2025-05-02 10:00:00")])
+    same = store.append([_quote(1100, 1150, "2025-05-02 10:15:00")])
+    replay = store.append([_quote(1100, 1150, "2025-05-02 10:15:00")])
+    changed = store.append([_quote(1105, 1155, "2025-05-02 10:30:00")])
+    failed = store.append([Quote.failure("BNA", "Error: timeout")])
+
+    assert [r["written"] for r in (first, same, replay, changed, failed)] == [1, 0, 0, 1, 0]
+    assert (same["heartbeats"], replay["duplicates"]) == (1, 1)
+    assert [row["sell_rate"] for row in _csv_rows(store.path)] == ["1150.00", "1155.00"]
+    assert _csv_rows(store.heartbeat_path) == [
+        {"source": "BNA", "currency": "USD", "seen_at": "2025-05-02 10:15:00"}
+    ]
+
+
+def test_rebuilt_index_matches_the_saved_one(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(1100, 1150, "2025-05-02 10:00:00")])
+    store.append(
+        [
+            _quote(1100, 1150, "2025-05-02 10:15:00"),
+            _quote(5.125, 6.125, "2025-05-02 10:15:00", currency="EUR"),
+        ]
+    )
+    store.load_history([_quote(900, 950, "2025-05-01 00:00:00")])
+    saved = QuoteStore(store.path).last_values()
+    os.remove(store.index_path)
+
+    rebuilt = QuoteStore(store.path).last_values()
+
+    assert rebuilt == saved
+    assert rebuilt["BNA|USD"]["seen_at"] == "2025-05-02 10:15:00"
+
+
+def test_index_left_behind_by_a_crash_is_rebuilt(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(1100, 1150, "2025-05-02 10:00:00")])
+    with open(store.index_path, encoding="utf-8") as f:
+        before = f.read()
+    store.append([_quote(1120, 1170, "2025-05-02 10:15:00")])
+    store.append([_quote(1120, 1170, "2025-05-02 10:30:00")])
+    # The writer died after appending, before saving the index
+    with open(store.index_path, "w", encoding="utf-8") as f:
+        f.write(before)
+
+    entry = QuoteStore(store.path).last_values()["BNA|USD"]
+
+    assert (entry["sell_rate"], entry["seen_at"]) == ("1170.00", "2025-05-02 10:30:00")
+
+
+def test_history_load_keeps_the_index_in_step(tmp_path, caplog):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(1100, 1150, "2025-05-02 10:00:00")])
+    store.load_history([_quote(900, 950, "2025-05-01 00:00:00")])
+
+    with caplog.at_level(logging.INFO):
+        entry = QuoteStore(store.path).last_values()["BNA|USD"]
+
+    assert entry["sell_rate"] == "1150.00"
+    assert "Rebuilt last-value index" not in caplog.text
+
+
+def test_day_index_of_a_replaced_file_is_rebuilt(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(1100, 1150, "2025-05-02 10:00:00")])
+    store.day_offsets()
+    # Same header, longer rows: the old offset now falls inside a line
+    with open(store.path, encoding="utf-8", newline="") as f:
+        header = f.readline()
+    with open(store.path, "w", encoding="utf-8", newline="") as f:
+        f.write(header)
+        f.write("2025-05-01 10:00:00,2025-05-01,1100.125,1150.125,BNA,USD,Success\r\n")
+        f.write("2025-05-02 10:00:00,2025-05-02,1100.00,1150.00,BNA,USD,Success\r\n")
+
+    assert sorted(store.day_offsets()["days"]) == ["2025-05-01", "2025-05-02"]
+
+
+def test_rate_at_is_confirmed_until_the_last_heartbeat_before_a_change(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    for when, sell in (("10:00", 1150), ("10:15", 1150), ("10:30", 1150), ("10:45", 1160)):
+        store.append([_quote(sell - 50, sell, f"2025-05-02 {when}:00")])
+
+    quote, confirmed_until = store.rate_at("BNA", datetime(2025, 5, 2, 10, 20))
+
+    assert quote.sell_rate == Decimal("1150")
+    assert confirmed_until == datetime(2025, 5, 2, 10, 30)
+
+
+def _append_runs(path, source, runs):
+    store = QuoteStore(path)
+    for minute in range(runs):
+        when = f"2025-05-02 10:{minute:02d}:00"
+        store.append([_quote(1000 + minute, 1050 + minute, when, source)])
+
+
+def test_concurrent_writers_neither_interleave_nor_duplicate(tmp_path):
+    path = str(tmp_path / "quotes.csv")
+    writers = [
+        multiprocessing.Process(target=_append_runs, args=(path, source, 30))
+        for source in ("BNA", "BBVA", "BNA")
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    rows = _csv_rows(path)
+    assert all(writer.exitcode == 0 for writer in writers)
+    assert all(len(row) == 7 and row["status"] == "Success" for row in rows)
+    keys = [(row["source"], row["collection_time"]) for row in rows]
+    # The second BNA writer repeats the first one's quotes: each is stored once
+    assert len(keys) == len(set(keys)) == 60
+
+
+def test_append_repairs_a_torn_last_line(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.csv"))
+    store.append([_quote(1100, 1150, "2025-05-02 10:00:00")])
+    with open(store.path, "a", encoding="utf-8") as f:
+        f.write("2025-05-02 10:05:00,2025-05-02,11")
+
+    store.append([_quote(1105, 1155, "2025-05-02 10:10:00")])
+
+    assert [row["sell_rate"] for row in _csv_rows(store.path)] == ["1150.00", "1155.00"]
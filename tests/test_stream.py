@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+from arbolito import stream
+from arbolito.stream import Broker, Subscriber
+
+
+class _Transport:
+    def __init__(self, buffered=0):
+        self.buffered = buffered
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class _Writer:
+    def __init__(self, buffered=0):
+        self.transport = _Transport(buffered)
+        self.sent = []
+        self.closed = False
+
+    def write(self, data):
+        self.sent.append(json.loads(data))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _broker(tmp_path, **kwargs):
+    return Broker(str(tmp_path / "s.sock"), str(tmp_path / "journal.jsonl"), **kwargs)
+
+
+def test_replay_is_flagged_and_capped(tmp_path):
+    broker = _broker(tmp_path, max_replay=3)
+    for n in range(5):
+        broker.publish({"n": n})
+
+    recent, behind = _Writer(), _Writer()
+    asyncio.run(broker._subscribe(3, recent))
+    asyncio.run(broker._subscribe(0, behind))
+
+    assert recent.sent == [
+        {"seq": 4, "batch": {"n": 3}, "replay": True},
+        {"seq": 5, "batch": {"n": 4}, "replay": True},
+    ]
+    assert behind.sent == [{"op": "reset", "seq": 5}]
+
+
+def test_subscriber_that_stopped_reading_is_dropped(tmp_path):
+    broker = _broker(tmp_path, max_buffer=100)
+    reading, stuck = _Writer(), _Writer(buffered=101)
+    broker.subscribers.update((reading, stuck))
+
+    broker.publish({"n": 1})
+
+    assert broker.subscribers == {reading}
+    assert stuck.closed and not stuck.sent
+    assert reading.sent == [{"seq": 1, "batch": {"n": 1}}]
+
+
+def test_subscriber_backs_off_after_a_clean_close(tmp_path, monkeypatch):
+    attempts = []
+
+    def backoff(attempt, **kwargs):
+        attempts.append(attempt)
+        return 0.01
+
+    monkeypatch.setattr(stream, "backoff_delay", backoff)
+
+    async def scenario():
+        async def close_at_once(reader, writer):
+            writer.close()
+
+        path = str(tmp_path / "s.sock")
+        server = await asyncio.start_unix_server(close_at_once, path)
+        async with server:
+            subscriber = Subscriber(lambda batch, replay: None, socket_path=path)
+            task = asyncio.ensure_future(subscriber.run())
+            await asyncio.sleep(0.2)
+            task.cancel()
+
+    asyncio.run(scenario())
+
+    assert len(attempts) >= 3
+    assert attempts == list(range(len(attempts)))